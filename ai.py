@@ -1,81 +1,497 @@
 """
 AI module: Implements Minimax with Alpha-Beta pruning for computer moves.
-Difficulty adjustable via search depth.
+Difficulty adjustable via search depth. Searched positions are remembered
+in a bounded transposition table keyed by Zobrist hash; moves are ordered
+(TT move, MVV-LVA captures, killers, history) and leaves are resolved with a
+capture-only quiescence search. An optional opening book and endgame
+tablebases are consulted before any search. With batch_eval the leaves are
+scored in NumPy batches (evaluation.py) instead of by the incremental score.
 """
 
-import asyncio
 import random
-from copy import deepcopy
-from piece import coords_to_pos
+import threading
+import time
+from engine import create_board
+from piece import square_to_pos, PIECE_CHARS
+from pst import PIECE_VALUES, CENTIPAWNS
+import evaluation
 
-PIECE_VALUES = {'P': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 1000}
+# Unsigned piece values indexed by (integer piece code + 6), for MVV-LVA
+ORDER_VALUES = [PIECE_VALUES[ch.upper()] if ch != '.' else 0 for ch in PIECE_CHARS]
+
+# Transposition table bound types
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# Deepest iteration tried when only a time or node budget is given
+MAX_DEPTH = 32
+# How many nodes to search between clock checks
+CHECK_EVERY = 256
+# Captures searched beyond the horizon before quiescence stands pat
+MAX_QDEPTH = 6
+# Scores beyond this mean the side to move loses its king
+KING_LOSS = PIECE_VALUES['K'] * CENTIPAWNS // 2
+
+# Counters kept in ChessAI.stats for every search
+SEARCH_COUNTERS = ['nodes', 'qnodes', 'cutoffs', 'first_move_cutoffs', 'tt_hits', 'tt_misses',
+                   'eval_batches', 'eval_positions']
+# Leaf scores remembered by position hash in batch evaluation mode
+LEAF_CACHE_SIZE = 1 << 16
+
+# Move ordering score bands: TT move, then captures, then killers, then history
+TT_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+KILLER_SCORE = 1 << 20
+
+class SearchTimeout(Exception):
+    """Raised inside the search when its time or node budget runs out."""
+
+class SearchCancelled(SearchTimeout):
+    """Raised inside the search when its stop_event is set from another thread."""
+
+class TranspositionTable:
+    """
+    Fixed-size, hash-indexed table of (key, depth, bound, score, best move, generation).
+    An entry is replaced when the slot is empty, holds the same position, was written
+    by an older search, or was searched less deeply than the new result.
+    """
+    # Rough CPython footprint of one stored entry (tuple plus its int/float members)
+    ENTRY_BYTES = 200
+
+    def __init__(self, size_mb=16):
+        slots = max(1, int(size_mb * 1024 * 1024) // self.ENTRY_BYTES)
+        self.size = 1 << (slots.bit_length() - 1)
+        self.mask = self.size - 1
+        self.slots = [None] * self.size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def new_search(self):
+        """Age existing entries so the next search may overwrite them freely."""
+        self.generation = (self.generation + 1) & 0xFF
+
+    def probe(self, key):
+        """Return the entry for key, or None."""
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        """Store a search result, subject to the replacement policy."""
+        index = key & self.mask
+        old = self.slots[index]
+        if old is not None:
+            if old[0] != key and old[5] == self.generation and old[1] > depth:
+                return
+            if old[0] != key:
+                self.replacements += 1
+        self.slots[index] = (key, depth, bound, score, move, self.generation)
+        self.stores += 1
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        self.slots = [None] * self.size
+        self.hits = self.misses = self.stores = self.replacements = 0
+
+    def stats(self):
+        """Return hit/miss counters and occupancy as a dict."""
+        probes = self.hits + self.misses
+        return {
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / probes if probes else 0.0,
+            'stores': self.stores,
+            'replacements': self.replacements,
+        }
 
 class ChessAI:
-    def __init__(self):
-        pass
-
-    async def get_best_move(self, game_state, depth=2):
-        """Return best move (from_pos, to_pos) for current player using Minimax."""
-        # Use asyncio.sleep to simulate async processing
-        await asyncio.sleep(0.1)
-        color = game_state.turn
-        board = game_state.board.copy()
-        best_score = float('-inf') if color == 'w' else float('inf')
+    def __init__(self, engine=None, tt_size_mb=16, ordering=True, quiescence=True, workers=0, analysis=None,
+                 book=None, tablebases=None, batch_eval=False):
+        # Board backend used for search; None searches with the game's own engine
+        self.engine = engine
+        # With workers > 1 root moves are split across a long-lived process pool
+        self.pool = None
+        if workers and workers > 1:
+            from parallel import SearchPool
+            self.pool = SearchPool(workers, engine, tt_size_mb, batch_eval)
+        self.tt = TranspositionTable(tt_size_mb)
+        # Optional AnalysisCache shared with other ChessAI instances (e.g. the coach's)
+        self.analysis = analysis
+        # Optional OpeningBook; a book move is played without searching
+        self.book = book
+        # Optional Tablebases; covered endings are played perfectly without searching
+        self.tablebases = tablebases
+        # evaluation.BatchEvaluator when batch_eval is asked for and NumPy is installed
+        self.evaluator = evaluation.BatchEvaluator() if batch_eval and evaluation.available() else None
+        # Position hash -> score of leaves evaluated in batches
+        self._leaf_scores = {}
+        self.ordering = ordering
+        self.quiescence = quiescence
+        self.killers = [[None, None] for _ in range(MAX_DEPTH + 1)]
+        self.history = [0] * (64 * 64)
+        self.stats = {}
+        self._deadline = None
+        self._max_nodes = None
+        # threading.Event that cancels a running search when set (used for pondering)
+        self.stop_event = None
+        self._phases = {}
+        # Called with self.stats after every search, e.g. Metrics.search_observer
+        self.observer = None
+        # Optional metrics.SearchProfiler that runs sampled searches under cProfile
+        self.profiler = None
+        # True: only transposition entries of exactly the node's depth cut off, so a score never
+        # depends on what this ChessAI searched before (set for pool workers and batch reviews)
+        self.exact_tt_depth = False
+        # Searches share killers, history and budgets, so one ChessAI searches one position at a time
+        self.lock = threading.Lock()
+
+    def get_best_move(self, game_state, depth=2, time_ms=None, max_nodes=None):
+        """
+        Return best move (from_pos, to_pos) for current player using Minimax.
+        With a time (milliseconds) or node budget the search deepens iteratively up to
+        depth (or MAX_DEPTH when depth is None) and returns the best move of the last
+        completed iteration.
+        """
+        best_move = self.search(game_state.board, game_state.turn, depth, time_ms, max_nodes)
+        if best_move is None:
+            return None, None
+        return square_to_pos(best_move[0]), square_to_pos(best_move[1])
+
+    def search(self, board, color, depth=2, time_ms=None, max_nodes=None):
+        """
+        Iterative deepening search from color's point of view.
+        Returns the chosen (from_sq, to_sq), or None when there is no move.
+        Concurrent callers (e.g. requests for different games) are serialized.
+        """
+        with self.lock:
+            if self.profiler is not None:
+                move = self.profiler.run(self._search, board, color, depth, time_ms, max_nodes)
+            else:
+                move = self._search(board, color, depth, time_ms, max_nodes)
+            if self.observer is not None:
+                self.observer(self.stats)
+            return move
+
+    def _search(self, board, color, depth, time_ms, max_nodes):
+        start = time.perf_counter()
+        # Milliseconds spent in each step of this search, for profiling where the time goes
+        self._phases = {}
+        budgeted = time_ms is not None or max_nodes is not None
+        if depth is None and not budgeted:
+            depth = 2
+        lap = start
+        if self.book is not None:
+            move = self.book.choose(board, color)
+            lap = self._phase('book', lap)
+            if move is not None:
+                return self._answered(move, start, 0, book_hit=True)
+        if self.tablebases is not None:
+            probe = self.tablebases.best_move(board, color)
+            lap = self._phase('tablebase', lap)
+            if probe is not None:
+                return self._answered(probe[0], start, 0, tb_hit=True)
+        key = (board.hash, color)
+        if self.analysis is not None:
+            record = self.analysis.lookup(key, depth, time_ms, max_nodes)
+            lap = self._phase('cache', lap)
+            if record is not None:
+                return self._answered(random.choice(record['moves']), start, record['depth'], cache_hit=True)
+        max_depth = depth if depth is not None else MAX_DEPTH
+        # Search runs on a single private board using make/unmake
+        board = create_board(self.engine, board) if self.engine else board.copy()
+        hits, misses = self.tt.hits, self.tt.misses
+        self.begin_search()
+        self.stats.update(depth=0, aborted=False, cancelled=False, cache_hit=False, book_hit=False,
+                          tb_hit=False, phase_ms=self._phases, iteration_ms=[])
         best_moves = []
-        for piece in board.all_pieces(color):
-            for move in piece.get_legal_moves(board):
-                new_board = board.copy()
-                new_board.move_piece(piece.position, move)
-                score = self.minimax(new_board, depth - 1, float('-inf'), float('inf'), color == 'b')
-                if (color == 'w' and score > best_score) or (color == 'b' and score < best_score):
-                    best_score = score
-                    best_moves = [(piece.position, move)]
-                elif score == best_score:
-                    best_moves.append((piece.position, move))
+        best_score = None
+        moves = self.order_moves(board, board.legal_moves(color), None, 0)
+        lap = self._phase('root_moves', lap)
+        for iteration in range(1, max_depth + 1):
+            try:
+                if self.pool is not None:
+                    scored = self.pool.score_root(board, color, moves, iteration, self)
+                else:
+                    scored = self.score_root(board, color, moves, iteration)
+            except SearchCancelled:
+                self.stats['aborted'] = self.stats['cancelled'] = True
+                break
+            except SearchTimeout:
+                self.stats['aborted'] = True
+                break
+            best_moves = self.best_moves(scored, color)
+            best_score = dict(scored)[best_moves[0]] if best_moves else None
+            self.stats['depth'] = iteration
+            # Time to depth: elapsed milliseconds when each iteration completed
+            self.stats['iteration_ms'].append((time.perf_counter() - start) * 1000)
+            # Search the previous iteration's best moves first next time
+            moves = best_moves + [move for move in moves if move not in best_moves]
+            # Budgets only apply once a first iteration has produced a move
+            if time_ms is not None:
+                self._deadline = start + time_ms / 1000
+            self._max_nodes = max_nodes
+        lap = self._phase('iterations', lap)
+        self.stats['tt_hits'] += self.tt.hits - hits
+        self.stats['tt_misses'] += self.tt.misses - misses
+        if best_moves and self.analysis is not None and not self.stats['cancelled']:
+            # A cancelled search did not spend its budget, so it must not claim it in the cache
+            self.analysis.store(key, best_moves, best_score, self.stats['depth'], time_ms, max_nodes)
+            self._phase('cache_store', lap)
+        self.stats['elapsed_ms'] = (time.perf_counter() - start) * 1000
         if not best_moves:
-            return None, None
-        from_pos, to_pos = random.choice(best_moves)
-        return coords_to_pos(from_pos), coords_to_pos(to_pos)
+            return None
+        return random.choice(best_moves)
 
-    def minimax(self, board, depth, alpha, beta, is_maximizing):
-        """Minimax with alpha-beta pruning."""
-        if depth == 0 or self.is_game_over(board):
+    def _phase(self, name, since):
+        """Record the time since `since` as phase name; returns the current time for the next phase."""
+        now = time.perf_counter()
+        self._phases[name] = (now - since) * 1000
+        return now
+
+    def _answered(self, move, start, depth, **hit):
+        """Set the stats of a search answered without searching (book, tablebase or cache) and return move."""
+        self.stats = dict.fromkeys(SEARCH_COUNTERS, 0)
+        self.stats.update(depth=depth, aborted=False, cancelled=False, cache_hit=False, book_hit=False,
+                          tb_hit=False, phase_ms=self._phases, iteration_ms=[])
+        self.stats.update(hit)
+        self.stats['elapsed_ms'] = (time.perf_counter() - start) * 1000
+        return move
+
+    def begin_search(self, time_ms=None, max_nodes=None):
+        """Reset per-search counters, killers and budgets before searching."""
+        self.tt.new_search()
+        self.stats = dict.fromkeys(SEARCH_COUNTERS, 0)
+        self._deadline = time.perf_counter() + time_ms / 1000 if time_ms is not None else None
+        self._max_nodes = max_nodes
+        self.killers = [[None, None] for _ in range(MAX_DEPTH + 1)]
+        self.history = [score >> 1 for score in self.history]
+
+    def score_root(self, board, color, moves, depth):
+        """Score every root move with a full window; return [(move, score), ...]."""
+        scored = []
+        if depth == 1 and self.evaluator is not None:
+            self.gather_leaves(board, moves)
+        for move in moves:
+            undo = board.make_move(*move)
+            score = self.minimax(board, depth - 1, float('-inf'), float('inf'), color == 'b', 1)
+            board.unmake_move(undo)
+            scored.append((move, score))
+        return scored
+
+    def best_moves(self, scored, color):
+        """Return the moves tied for the best score for color, in scored order."""
+        if not scored:
+            return []
+        pick = max if color == 'w' else min
+        best_score = pick(score for _, score in scored)
+        return [move for move, score in scored if score == best_score]
+
+    def minimax(self, board, depth, alpha, beta, is_maximizing, ply=0):
+        """Minimax with alpha-beta pruning and transposition table lookups."""
+        nodes = self.stats['nodes'] = self.stats['nodes'] + 1
+        if nodes % CHECK_EVERY == 0 or (self._max_nodes is not None and nodes >= self._max_nodes):
+            self.check_budget(nodes)
+        if self.is_game_over(board):
             return self.evaluate(board)
-        color = 'w' if is_maximizing else 'b'
+        if depth == 0:
+            if self.quiescence:
+                return self.quiesce(board, alpha, beta, is_maximizing, 0)
+            return self.evaluate(board)
+        key = board.position_key('w' if is_maximizing else 'b')
+        entry = self.tt.probe(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            # A deeper result is at least as good, unless scores must not depend on earlier searches
+            if entry[1] == depth or entry[1] > depth and not self.exact_tt_depth:
+                bound, score = entry[2], entry[3]
+                if bound == EXACT:
+                    return score
+                if bound == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if beta <= alpha:
+                    return score
+        moves = self.order_moves(board, board.generate_moves('w' if is_maximizing else 'b'), tt_move, ply)
+        if depth == 1 and self.evaluator is not None:
+            self.gather_leaves(board, moves)
+        alpha_start, beta_start = alpha, beta
+        best_move = None
         if is_maximizing:
-            max_eval = float('-inf')
-            for piece in board.all_pieces(color):
-                for move in piece.get_legal_moves(board):
-                    new_board = board.copy()
-                    new_board.move_piece(piece.position, move)
-                    eval = self.minimax(new_board, depth - 1, alpha, beta, False)
-                    max_eval = max(max_eval, eval)
-                    alpha = max(alpha, eval)
-                    if beta <= alpha:
-                        break
-            return max_eval
+            best = float('-inf')
+            for index, move in enumerate(moves):
+                undo = board.make_move(*move)
+                eval = self.minimax(board, depth - 1, alpha, beta, False, ply + 1)
+                board.unmake_move(undo)
+                if eval > best:
+                    best, best_move = eval, move
+                if best >= beta:
+                    self.record_cutoff(board, move, depth, ply, index)
+                    break
+                alpha = max(alpha, best)
+        else:
+            best = float('inf')
+            for index, move in enumerate(moves):
+                undo = board.make_move(*move)
+                eval = self.minimax(board, depth - 1, alpha, beta, True, ply + 1)
+                board.unmake_move(undo)
+                if eval < best:
+                    best, best_move = eval, move
+                if best <= alpha:
+                    self.record_cutoff(board, move, depth, ply, index)
+                    break
+                beta = min(beta, best)
+        # Inside the tree moves are pseudo-legal, so a side with no legal move "loses" its
+        # king; that is only right when it is in check, otherwise it is stalemate
+        if is_maximizing and best <= -KING_LOSS or not is_maximizing and best >= KING_LOSS:
+            color = 'w' if is_maximizing else 'b'
+            if not board.in_check(color) and not board.legal_moves(color):
+                best, best_move = 0, None
+        if best <= alpha_start:
+            bound = UPPER
+        elif best >= beta_start:
+            bound = LOWER
         else:
-            min_eval = float('inf')
-            for piece in board.all_pieces(color):
-                for move in piece.get_legal_moves(board):
-                    new_board = board.copy()
-                    new_board.move_piece(piece.position, move)
-                    eval = self.minimax(new_board, depth - 1, alpha, beta, True)
-                    min_eval = min(min_eval, eval)
-                    beta = min(beta, eval)
-                    if beta <= alpha:
-                        break
-            return min_eval
+            bound = EXACT
+        self.tt.store(key, depth, bound, best, best_move)
+        return best
+
+    def quiesce(self, board, alpha, beta, is_maximizing, qdepth):
+        """Capture-only search past the horizon, standing pat on the static evaluation."""
+        nodes = self.stats['nodes'] = self.stats['nodes'] + 1
+        self.stats['qnodes'] += 1
+        if nodes % CHECK_EVERY == 0 or (self._max_nodes is not None and nodes >= self._max_nodes):
+            self.check_budget(nodes)
+        best = self.evaluate(board)
+        if qdepth >= MAX_QDEPTH or self.is_game_over(board):
+            return best
+        cells = board.cells
+        captures = board.generate_captures('w' if is_maximizing else 'b')
+        if self.ordering:
+            captures.sort(key=lambda move: ORDER_VALUES[cells[move[1]] + 6] * 64 - ORDER_VALUES[cells[move[0]] + 6],
+                          reverse=True)
+        if is_maximizing:
+            if best >= beta:
+                return best
+            alpha = max(alpha, best)
+            if self.evaluator is not None:
+                self.gather_leaves(board, captures)
+            for move in captures:
+                undo = board.make_move(*move)
+                score = self.quiesce(board, alpha, beta, False, qdepth + 1)
+                board.unmake_move(undo)
+                if score > best:
+                    best = score
+                if best >= beta:
+                    break
+                alpha = max(alpha, best)
+        else:
+            if best <= alpha:
+                return best
+            beta = min(beta, best)
+            if self.evaluator is not None:
+                self.gather_leaves(board, captures)
+            for move in captures:
+                undo = board.make_move(*move)
+                score = self.quiesce(board, alpha, beta, True, qdepth + 1)
+                board.unmake_move(undo)
+                if score < best:
+                    best = score
+                if best <= alpha:
+                    break
+                beta = min(beta, best)
+        return best
+
+    def order_moves(self, board, moves, tt_move, ply):
+        """Sort moves best-first: TT move, MVV-LVA captures, killer moves, then history score."""
+        if not self.ordering:
+            return moves
+        cells = board.cells
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history
+
+        def score(move):
+            if move == tt_move:
+                return TT_MOVE_SCORE
+            from_sq, to_sq = move
+            victim = cells[to_sq]
+            if victim:
+                return CAPTURE_SCORE + ORDER_VALUES[victim + 6] * 64 - ORDER_VALUES[cells[from_sq] + 6]
+            if move in killers:
+                return KILLER_SCORE
+            return history[from_sq * 64 + to_sq]
+        moves.sort(key=score, reverse=True)
+        return moves
+
+    def record_cutoff(self, board, move, depth, ply, index):
+        """Count a beta cutoff and remember quiet cutoff moves as killers and in the history table."""
+        self.stats['cutoffs'] += 1
+        if index == 0:
+            self.stats['first_move_cutoffs'] += 1
+        if board.cells[move[1]] or ply >= len(self.killers):
+            return
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[move[0] * 64 + move[1]] += depth * depth
+
+    def close(self):
+        """Shut down the worker pool, if any."""
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def check_budget(self, nodes):
+        """Abort the current iteration when the time or node budget is spent or the search is cancelled."""
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchCancelled()
+        if self._max_nodes is not None and nodes >= self._max_nodes:
+            raise SearchTimeout()
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise SearchTimeout()
 
     def evaluate(self, board):
-        """Simple evaluation: sum of piece values."""
-        score = 0
-        for piece in board.all_pieces():
-            val = PIECE_VALUES.get(piece.code.upper(), 0)
-            score += val if piece.color == 'w' else -val
+        """
+        Material plus piece-square score in centipawns, kept incrementally by the board.
+        In batch evaluation mode: the batch score gathered for this leaf, or a batch of one.
+        """
+        if self.evaluator is None:
+            return board.score
+        score = self._leaf_scores.get(board.hash)
+        if score is None:
+            score = self._evaluate_batch([board.hash], [board.cells.tobytes()])[0]
         return score
 
+    def gather_leaves(self, board, moves):
+        """Score the positions after each of moves in one batch, so evaluate finds them cached."""
+        scores = self._leaf_scores
+        keys, positions = [], []
+        for move in moves:
+            undo = board.make_move(*move)
+            key = board.hash
+            if key not in scores and key not in keys:
+                keys.append(key)
+                positions.append(board.cells.tobytes())
+            board.unmake_move(undo)
+        if keys:
+            self._evaluate_batch(keys, positions)
+
+    def _evaluate_batch(self, keys, positions):
+        scores = self.evaluator.evaluate(positions)
+        if len(self._leaf_scores) + len(keys) > LEAF_CACHE_SIZE:
+            self._leaf_scores = {}
+        self._leaf_scores.update(zip(keys, scores))
+        self.stats['eval_batches'] += 1
+        self.stats['eval_positions'] += len(keys)
+        return scores
+
     def is_game_over(self, board):
         """Game over if one king left."""
-        kings = [p for p in board.all_pieces() if p.code.upper() == 'K']
-        return len(kings) < 2
\ No newline at end of file
+        return board.king_captured()
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Analysis module: Position-keyed cache of search results shared by ChessAI
+and Coach, so the same position is not searched twice for /move and /suggest.
+Entries are keyed by (Zobrist hash, side to move) and evicted least recently used.
+"""
+
+import threading
+from collections import OrderedDict
+
+class AnalysisCache:
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key, depth=None, time_ms=None, max_nodes=None):
+        """
+        Return the cached result for key if it was searched at least as hard as
+        requested (deeper, or with at least the same time/node budget), else None.
+        """
+        with self.lock:
+            record = self.entries.get(key)
+            if record is not None and self._satisfies(record, depth, time_ms, max_nodes):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return record
+            self.misses += 1
+            return None
+
+    def _satisfies(self, record, depth, time_ms, max_nodes):
+        if time_ms is None and max_nodes is None:
+            return depth is not None and record['depth'] >= depth
+        if depth is not None and record['depth'] >= depth:
+            return True
+        if time_ms is not None and (record['time_ms'] is None or record['time_ms'] < time_ms):
+            return False
+        if max_nodes is not None and (record['max_nodes'] is None or record['max_nodes'] < max_nodes):
+            return False
+        return True
+
+    def store(self, key, moves, score, depth, time_ms=None, max_nodes=None):
+        """Remember the best moves found for key and the effort spent finding them."""
+        record = {'moves': moves, 'score': score, 'depth': depth, 'time_ms': time_ms, 'max_nodes': max_nodes}
+        with self.lock:
+            old = self.entries.get(key)
+            # Never replace a deeper result with a shallower one
+            if old is not None and old['depth'] > depth:
+                return
+            self.entries[key] = record
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current size."""
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
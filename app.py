@@ -1,25 +1,153 @@
 """
 Flask main application for Chess Game with Coach.
 Handles routes for UI, moves, AI, coach suggestions, save/load.
+Searching routes are async views that await the search executor; asgi.py
+exposes the app to ASGI servers.
 """
 
-import asyncio
+import atexit
 import json
 import os
-from flask import Flask, render_template, request, jsonify, send_from_directory
+import time
+from flask import Flask, Response, g, render_template, request, jsonify, send_from_directory, stream_with_context
 from board import Board
 from game_state import GameState
 from ai import ChessAI
+from analysis import AnalysisCache
 from coach import Coach
+from book import open_book
+from tablebase import Tablebases
+from executor import SearchExecutor, ServerBusy
+from ponder import Ponderer, make_searchers
+from storage import GameStore
+from batch import BatchAnalyzer
+from metrics import Metrics, SearchProfiler
+from registry import GameRegistry, GameSession, valid_game_id
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 
-# Global game state (for demo; in production, use sessions or DB)
-game_state = GameState()
-ai = ChessAI()
-coach = Coach()
+# Move generation backend: 'mailbox' (default) or 'bitboard'
+ENGINE = os.environ.get('CHESS_ENGINE', 'mailbox')
+# Leaf evaluation: 'incremental' (material + piece-square) or 'batch' (adds mobility, pawn
+# structure and king shield, scored with NumPy; falls back to incremental without NumPy)
+BATCH_EVAL = os.environ.get('CHESS_EVAL', 'incremental') == 'batch'
 
-GAMES_PATH = os.path.join(os.path.dirname(__file__), 'games', 'saved_games.json')
+# Search budgets in milliseconds; clients may ask for less than MAX_TIME_MS
+AI_TIME_MS = int(os.environ.get('CHESS_AI_TIME_MS', 500))
+COACH_TIME_MS = int(os.environ.get('CHESS_COACH_TIME_MS', 200))
+MAX_TIME_MS = int(os.environ.get('CHESS_MAX_TIME_MS', 2000))
+# Worker processes for root-parallel AI search; 0 or 1 searches in-process
+SEARCH_WORKERS = int(os.environ.get('CHESS_SEARCH_WORKERS', 0))
+# Positions remembered by the shared analysis cache
+ANALYSIS_CACHE_SIZE = int(os.environ.get('CHESS_ANALYSIS_CACHE_SIZE', 4096))
+# Background analysis between moves: 1 to enable, 0 to disable
+PONDER = os.environ.get('CHESS_PONDER', '1') == '1'
+# Games pondering at the same time (each pondering search holds a transposition table)
+PONDER_SEARCHERS = int(os.environ.get('CHESS_PONDER_SEARCHERS', 2))
+# Games kept in memory, and seconds before an untouched game is spilled to disk
+MAX_GAMES = int(os.environ.get('CHESS_MAX_GAMES', 1000))
+GAME_IDLE_SECONDS = int(os.environ.get('CHESS_GAME_IDLE_SECONDS', 600))
+# Threads running /move and /suggest searches, and how many such requests may queue before 503
+SEARCH_THREADS = int(os.environ.get('CHESS_SEARCH_THREADS', 2))
+SEARCH_QUEUE = int(os.environ.get('CHESS_SEARCH_QUEUE', 16))
+# Opening book file; compiled from openings.pgn on first start if it does not exist
+BOOK_PATH = os.environ.get('CHESS_BOOK', os.path.join(os.path.dirname(__file__), 'games', 'book.bin'))
+# Endgame tables written by `python tablebase.py generate`; missing tables are simply not used
+TABLEBASE_DIR = os.environ.get('CHESS_TABLEBASES', os.path.join(os.path.dirname(__file__), 'games', 'tablebases'))
+# Worker processes scoring /analyze reviews, and the deepest search a review may ask for
+BATCH_WORKERS = int(os.environ.get('CHESS_BATCH_WORKERS', 2))
+BATCH_MAX_DEPTH = int(os.environ.get('CHESS_BATCH_MAX_DEPTH', 3))
+# 1 adds a Server-Timing header (per-phase milliseconds) to every response
+TIMING_HEADERS = os.environ.get('CHESS_TIMING_HEADERS', '0') == '1'
+# Run one in every N AI and coach searches under cProfile (0 disables), saving .prof files here
+PROFILE_EVERY = int(os.environ.get('CHESS_PROFILE_EVERY', 0))
+PROFILE_DIR = os.environ.get('CHESS_PROFILE_DIR', os.path.join(os.path.dirname(__file__), 'games', 'profiles'))
+
+# Shared searchers: the AI and coach answer repeated questions about a position from one
+# cache, and every game's coach and ponderer borrow these instead of owning transposition tables
+analysis = AnalysisCache(ANALYSIS_CACHE_SIZE)
+# The AI and coach answer opening positions from the book instead of searching them
+book = open_book(BOOK_PATH, os.path.join(os.path.dirname(__file__), 'openings.pgn'))
+# Covered endings (KQK, KRK, KPK) are played and explained from the tablebases
+tablebases = Tablebases(TABLEBASE_DIR)
+ai = ChessAI(ENGINE, workers=SEARCH_WORKERS, analysis=analysis, book=book, tablebases=tablebases,
+             batch_eval=BATCH_EVAL)
+coach_ai = ChessAI(ENGINE, analysis=analysis, batch_eval=BATCH_EVAL)
+# At most PONDER_SEARCHERS games ponder at the same time
+ponder_searchers = make_searchers(PONDER_SEARCHERS, ENGINE, analysis, batch_eval=BATCH_EVAL)
+# Searches never run on the request path; cheap routes (/load, /save) stay responsive
+searches = SearchExecutor(SEARCH_THREADS, SEARCH_QUEUE)
+# Game reviews run in their own process pool, started on the first /analyze
+reviews = BatchAnalyzer(BATCH_WORKERS, ENGINE)
+
+# Route latency, /move phases and per-search statistics, scraped from /metrics
+metrics = Metrics()
+ai.observer = metrics.search_observer('ai')
+coach_ai.observer = metrics.search_observer('coach')
+profiler = SearchProfiler(PROFILE_EVERY, PROFILE_DIR) if PROFILE_EVERY > 0 else None
+ai.profiler = coach_ai.profiler = profiler
+
+GAMES_DIR = os.path.join(os.path.dirname(__file__), 'games')
+# Saved games: moves appended per game, with periodic position snapshots
+store = GameStore(os.environ.get('CHESS_GAMES_DB', os.path.join(GAMES_DIR, 'games.db')))
+DEFAULT_GAME_ID = 'default'
+
+def new_session(game_id):
+    """Build the per-game state: board, coach feedback and ponder thread."""
+    return GameSession(game_id, GameState(ENGINE),
+                       Coach(ENGINE, time_ms=COACH_TIME_MS, ai=coach_ai, book=book, tablebases=tablebases),
+                       Ponderer(ponder_searchers, time_ms=AI_TIME_MS))
+
+# Games by id; least recently used and idle games are spilled to games/sessions/
+games = GameRegistry(new_session, os.path.join(GAMES_DIR, 'sessions'),
+                     max_active=MAX_GAMES, idle_seconds=GAME_IDLE_SECONDS)
+
+def request_game_id():
+    """The game a request is for: game_id in the JSON body or query string, else the default game."""
+    data = request.get_json(silent=True) or {}
+    return data.get('game_id') or request.args.get('game_id') or DEFAULT_GAME_ID
+
+def invalid_game_id():
+    return jsonify({'success': False, 'message': 'Invalid game id.'}), 400
+
+def server_busy():
+    return jsonify({'success': False, 'message': 'Server busy, try again shortly.'}), 503, {'Retry-After': '1'}
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    # Phase name -> milliseconds, filled in by routes that time their steps
+    g.timings = {}
+
+@app.after_request
+def record_latency(response):
+    """Record the route's latency and, if enabled, report the timings in a Server-Timing header."""
+    elapsed = time.perf_counter() - g.started
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.observe('chess_request_duration_seconds', 'Request latency by route.', elapsed, route=route)
+    metrics.inc('chess_requests_total', 'Requests by route and status code.', route=route,
+                status=response.status_code)
+    if TIMING_HEADERS:
+        phases = [f'{name};dur={ms:.1f}' for name, ms in g.timings.items()]
+        response.headers['Server-Timing'] = ', '.join(phases + [f'total;dur={elapsed * 1000:.1f}'])
+    return response
+
+def server_stats():
+    """Counters and gauges kept by the server's components, read at scrape time."""
+    cache = analysis.stats()
+    return [
+        ('chess_games_active', 'gauge', 'Games held in memory.', {(): len(games)}),
+        ('chess_games_total', 'counter', 'Games created, restored from disk and spilled to disk.',
+         {(('event', name),): value for name, value in games.stats.items()}),
+        ('chess_search_jobs_total', 'counter', 'Search executor jobs submitted, rejected and completed.',
+         {(('event', name),): value for name, value in searches.stats.items()}),
+        ('chess_search_jobs_pending', 'gauge', 'Search executor jobs queued or running.', {(): searches.pending}),
+        ('chess_analysis_cache_total', 'counter', 'Analysis cache lookups and evictions.',
+         {(('event', name),): cache[name] for name in ('hits', 'misses', 'evictions')}),
+        ('chess_analysis_cache_entries', 'gauge', 'Positions in the analysis cache.', {(): cache['size']}),
+    ]
+
+metrics.register(server_stats)
 
 @app.route('/')
 def index():
@@ -27,89 +155,205 @@ def index():
     return render_template('index.html')
 
 @app.route('/move', methods=['POST'])
-def move():
+async def move():
     """
     Handle player move, validate, update state, get AI move and coach feedback.
-    Expects JSON: {from: "e2", to: "e4", mode: "ai" or "human"}
-    Returns: {success, board, move_history, ai_move, coach_feedback}
+    Expects JSON: {game_id, from: "e2", to: "e4", mode: "ai" or "human", time_ms: optional AI budget
+                   (clamped to 1..MAX_TIME_MS; not a number answers 400),
+                   version: the client's last version}
+    Returns: {success, game_id, ai_move, coach_feedback} plus GameState.delta(version):
+    the changed squares and new moves since version (or the full board and history),
+    the new version, turn and legal-move map.
+    The searches run on the search executor; a full queue answers 503.
     """
     data = request.get_json()
+    game_id = request_game_id()
+    if not valid_game_id(game_id):
+        return invalid_game_id()
+    try:
+        time_ms = max(1, min(int(data.get('time_ms') or AI_TIME_MS), MAX_TIME_MS))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid time_ms.'}), 400
+    try:
+        result = await searches.run(play_move, game_id, data, time_ms, g.timings)
+    except ServerBusy:
+        return server_busy()
+    start = time.perf_counter()
+    response = jsonify(result)
+    g.timings['serialize'] = (time.perf_counter() - start) * 1000
+    for phase, ms in g.timings.items():
+        metrics.observe('chess_move_phase_seconds', 'Time spent in each step of /move.', ms / 1000, phase=phase)
+    return response
+
+def play_move(game_id, data, time_ms, timings):
+    """
+    Body of /move, run on the search executor; returns the response dict and
+    records the milliseconds spent in each step in timings.
+    """
+    lap = time.perf_counter()
+
+    def phase(name):
+        nonlocal lap
+        now = time.perf_counter()
+        timings[name] = timings.get(name, 0) + (now - lap) * 1000
+        lap = now
+
     from_sq = data.get('from')
     to_sq = data.get('to')
     mode = data.get('mode', 'ai')
-    player_color = game_state.turn
+    since = data.get('version')
+    with games.session(game_id) as session:
+        game_state = session.game_state
+        player_color = game_state.turn
+        # The request gets the CPU; whatever pondering found is already in the cache
+        session.ponderer.cancel()
+        phase('session')
 
-    # Validate and make player move
-    valid, msg = game_state.make_move(from_sq, to_sq)
-    if not valid:
-        return jsonify({'success': False, 'message': msg, 'board': game_state.board.to_dict(), 'move_history': game_state.move_history})
+        # Validate and make player move
+        valid, msg = game_state.make_move(from_sq, to_sq)
+        phase('validate')
+        if not valid:
+            return {'success': False, 'message': msg, **game_state.delta(since)}
 
-    # Coach feedback on player's move
-    feedback = asyncio.run(coach.analyze_move(game_state, from_sq, to_sq, player_color))
+        # Only do AI move if mode is 'ai' and game is not over and it's now black's turn.
+        # The reply is searched before the coach looks at the same position, so the
+        # coach's (smaller budget) search is answered from the analysis cache.
+        ai_from = ai_to = None
+        if mode == 'ai' and not game_state.is_game_over() and game_state.turn == 'b':
+            ai_from, ai_to = ai.get_best_move(game_state, depth=None, time_ms=time_ms)
+            phase('ai')
 
-    ai_move = None
-    # Only do AI move if mode is 'ai' and game is not over and it's now black's turn
-    if mode == 'ai' and not game_state.is_game_over() and game_state.turn == 'b':
-        ai_from, ai_to = asyncio.run(ai.get_best_move(game_state, depth=2))
+        # Coach feedback on player's move
+        feedback = session.coach.analyze_move(game_state, from_sq, to_sq, player_color)
+        phase('coach')
+
+        ai_move = None
         if ai_from and ai_to:
             game_state.make_move(ai_from, ai_to)
             ai_move = {'from': ai_from, 'to': ai_to}
-            feedback += asyncio.run(coach.analyze_move(game_state, ai_from, ai_to, game_state.turn))
+            feedback += session.coach.analyze_move(game_state, ai_from, ai_to, game_state.turn)
+            phase('coach')
+
+        if PONDER and not game_state.is_game_over():
+            session.ponderer.start(game_state, reply=(mode == 'ai'))
+            phase('ponder')
 
-    return jsonify({
-        'success': True,
-        'board': game_state.board.to_dict(),
-        'move_history': game_state.move_history,
-        'ai_move': ai_move,
-        'coach_feedback': feedback,
-        'turn': game_state.turn
-    })
+        delta = game_state.delta(since)
+        phase('delta')
+        return {
+            'success': True,
+            'game_id': game_id,
+            'ai_move': ai_move,
+            'coach_feedback': feedback,
+            **delta
+        }
 
 @app.route('/save', methods=['POST'])
 def save():
-    """Save current game state to JSON file."""
-    with open(GAMES_PATH, 'w') as f:
-        json.dump(game_state.to_dict(), f)
-    return jsonify({'success': True})
+    """Append the game's new moves to the game store."""
+    game_id = request_game_id()
+    if not valid_game_id(game_id):
+        return invalid_game_id()
+    with games.session(game_id) as session:
+        store.save(game_id, session.game_state)
+    return jsonify({'success': True, 'game_id': game_id})
 
 
 @app.route('/load', methods=['GET'])
 def load():
-    """Load game state from JSON file, or start new game if none exists."""
-    if not os.path.exists(GAMES_PATH):
-        game_state.reset()
-        return jsonify({
-            'success': True,
-            'board': game_state.board.to_dict(),
-            'move_history': game_state.move_history,
-            'turn': game_state.turn
-        })
-    with open(GAMES_PATH, 'r') as f:
+    """Load the game from the game store, or start a new game if it was never saved."""
+    game_id = request_game_id()
+    if not valid_game_id(game_id):
+        return invalid_game_id()
+    with games.session(game_id) as session:
+        game_state = session.game_state
+        session.ponderer.cancel()
+        session.coach.last_feedback = []
         try:
-            data = json.load(f)
-            if not data or 'board' not in data:
+            if not store.load(game_id, game_state):
                 game_state.reset()
-            else:
-                game_state.from_dict(data)
         except Exception:
             game_state.reset()
-    return jsonify({
-        'success': True,
-        'board': game_state.board.to_dict(),
-        'move_history': game_state.move_history,
-        'turn': game_state.turn
-    })
+        return jsonify({
+            'success': True,
+            'game_id': game_id,
+            **game_state.delta()
+        })
 
 @app.route('/suggest', methods=['GET'])
-def suggest():
+async def suggest():
     """Return coach suggestions for thought bubbles."""
-    suggestions = asyncio.run(coach.get_suggestions(game_state))
+    game_id = request_game_id()
+    if not valid_game_id(game_id):
+        return invalid_game_id()
+    try:
+        suggestions = await searches.run(game_suggestions, game_id)
+    except ServerBusy:
+        return server_busy()
     return jsonify({'suggestions': suggestions})
 
+def game_suggestions(game_id):
+    with games.session(game_id) as session:
+        return session.coach.get_suggestions(session.game_state)
+
+@app.route('/analyze', methods=['POST'])
+def analyze():
+    """
+    Stream a move-by-move review as NDJSON: one record per move, then a summary record.
+    Body: {'game_ids': [...]} for saved games, or {'games': [{'game_id', 'move_history'}, ...]};
+    with neither, the request's own game is reviewed. Optional 'depth' (clamped to 1..BATCH_MAX_DEPTH).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        depth = max(1, min(int(data.get('depth') or 2), BATCH_MAX_DEPTH))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid depth.'}), 400
+    if 'game_ids' in data:
+        game_ids = data['game_ids']
+        if not isinstance(game_ids, list) or not all(valid_game_id(game_id) for game_id in game_ids):
+            return invalid_game_id()
+        # Saved histories are read one game at a time while the review streams
+        reviewed = ((game_id, store.history(game_id)) for game_id in game_ids)
+    elif 'games' in data:
+        if not isinstance(data['games'], list) or not all(
+                isinstance(game, dict) and isinstance(game.get('move_history'), list) for game in data['games']):
+            return jsonify({'success': False, 'message': "'games' must be a list of {game_id, move_history}."}), 400
+        reviewed = ((game.get('game_id', str(index)), game.get('move_history') or [])
+                    for index, game in enumerate(data['games']))
+    else:
+        game_id = request_game_id()
+        if not valid_game_id(game_id):
+            return invalid_game_id()
+        with games.session(game_id) as session:
+            reviewed = [(game_id, list(session.game_state.move_history))]
+
+    def stream():
+        for record in reviews.analyze(reviewed, depth):
+            yield json.dumps(record) + '\n'
+    return Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+
+@app.route('/metrics', methods=['GET'])
+def metrics_page():
+    """Prometheus scrape endpoint: route latency, /move phases, search statistics and server counters."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/profile', methods=['GET'])
+def profile_page():
+    """The top functions of the latest profiled search (CHESS_PROFILE_EVERY > 0)."""
+    if profiler is None:
+        return Response('Search profiling is off; set CHESS_PROFILE_EVERY.\n', status=404, mimetype='text/plain')
+    return Response(profiler.last_report or 'No search profiled yet.\n', mimetype='text/plain')
+
 @app.route('/static/<path:filename>')
 def static_files(filename):
     """Serve static files."""
     return send_from_directory(app.static_folder, filename)
 
 if __name__ == '__main__':
+    # Warm up the search workers before serving the first request
+    if ai.pool is not None:
+        ai.pool.start()
+    # Persist in-memory games so a restart picks them up from games/sessions/
+    atexit.register(games.close)
+    atexit.register(reviews.close)
     app.run(debug=True)
\ No newline at end of file
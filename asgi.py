@@ -0,0 +1,18 @@
+"""
+ASGI entry point: Serve the game with an ASGI server, e.g.
+    uvicorn asgi:application
+Requests are handed to the Flask app on worker threads; /move and /suggest
+await their searches on the app's bounded SearchExecutor.
+"""
+
+import atexit
+from asgiref.wsgi import WsgiToAsgi
+from app import app, ai, games, reviews
+
+# The process pool (if any) is started here rather than on the first /move
+if ai.pool is not None:
+    ai.pool.start()
+atexit.register(games.close)
+atexit.register(reviews.close)
+
+application = WsgiToAsgi(app)
@@ -0,0 +1,200 @@
+"""
+Batch module: Reviews whole games offline. Each game's move_history is replayed
+and every move is scored against the engine's best move at a fixed depth, with
+positions spread over a pool of worker processes. Results stream out one move at
+a time, in game order, followed by a summary with the throughput in moves per
+second; only a bounded window of positions is in flight at once.
+Run with: python batch.py [--game GAME_ID ...] [--file game.json ...] > review.ndjson
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import deque
+from ai import ChessAI
+from engine import create_board
+from game_state import GameState
+from parallel import SearchPool
+from piece import pos_to_coords, to_square, square_to_pos
+from storage import GameStore
+
+# Centipawns lost against the best move, and the verdict for losing at most that much
+VERDICTS = [(0, 'best'), (50, 'good'), (100, 'inaccuracy'), (300, 'mistake')]
+# Positions queued per worker; bounds memory however many games are streamed in
+WINDOW_PER_WORKER = 4
+
+def score_position(ai, packed, color, move, depth):
+    """
+    Score every legal move of a packed position with ai to depth plies.
+    Returns (best move, best score, played move's score, nodes); scores are from white's side.
+    """
+    board = create_board(ai.engine)
+    board.from_bytes(packed)
+    ai.begin_search()
+    moves = ai.order_moves(board, board.legal_moves(color), None, 0)
+    scores = dict(ai.score_root(board, color, moves, depth))
+    best = ai.best_moves(list(scores.items()), color)[0]
+    return best, scores[best], scores[move], ai.stats['nodes']
+
+def verdict(loss):
+    for limit, name in VERDICTS:
+        if loss <= limit:
+            return name
+    return 'blunder'
+
+class BatchAnalyzer:
+    def __init__(self, workers=2, engine=None, depth=2, tt_size_mb=16):
+        # With workers > 1 positions are scored on a parallel.SearchPool, else in this process
+        self.workers = workers
+        self.engine = engine
+        self.depth = depth
+        self.tt_size_mb = tt_size_mb
+        self.pool = None
+        self.ai = None
+        # Guards pool start-up and the in-process ChessAI, which scores one position at a time
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.workers > 1 and self.pool is None:
+                self.pool = SearchPool(self.workers, self.engine, self.tt_size_mb)
+                self.pool.start()
+            elif self.workers <= 1 and self.ai is None:
+                self.ai = ChessAI(self.engine, self.tt_size_mb)
+                # As on the pool's workers, so a review does not depend on the positions scored before it
+                self.ai.exact_tt_depth = True
+
+    def analyze(self, games, depth=None):
+        """
+        Generate one record per move of games, an iterable of (game_id, move_history),
+        then a final {'summary': ...} record. A move that does not replay ends its
+        game with an {'error': ...} record, as does a move_history of None.
+        Raises ValueError (before anything is generated) if depth is below 1.
+        """
+        depth = depth or self.depth
+        if depth < 1:
+            raise ValueError(f"depth must be at least 1, got {depth}")
+        return self._analyze(games, depth)
+
+    def _analyze(self, games, depth):
+        self.start()
+        window = max(1, self.workers) * WINDOW_PER_WORKER
+        pending = deque()
+        summary = {'games': 0, 'moves': 0, 'errors': 0, 'nodes': 0}
+        start = time.perf_counter()
+        for task in self._positions(games, summary):
+            if 'error' in task:
+                # Keep the stream in game order: report after the moves queued before it
+                while pending:
+                    yield self._record(pending.popleft(), summary)
+                summary['errors'] += 1
+                yield task
+                continue
+            pending.append((task, self._submit(task, depth)))
+            if len(pending) >= window:
+                yield self._record(pending.popleft(), summary)
+        while pending:
+            yield self._record(pending.popleft(), summary)
+        elapsed = time.perf_counter() - start
+        summary['elapsed_s'] = round(elapsed, 3)
+        summary['moves_per_s'] = round(summary['moves'] / elapsed, 1) if elapsed else 0.0
+        yield {'summary': summary}
+
+    def _positions(self, games, summary):
+        """Replay each game, yielding the position before every move as a task."""
+        game_state = GameState(self.engine)
+        for game_id, history in games:
+            summary['games'] += 1
+            if history is None:
+                yield {'game_id': game_id, 'ply': 0, 'error': "Game not found."}
+                continue
+            game_state.reset()
+            for ply, move in enumerate(history):
+                color = game_state.turn
+                packed = game_state.board.to_bytes()
+                try:
+                    ok, msg = game_state.make_move(move['from'], move['to'])
+                except (KeyError, TypeError, ValueError, IndexError):
+                    yield {'game_id': game_id, 'ply': ply, 'error': f"Malformed move {move!r}."}
+                    break
+                if not ok:
+                    yield {'game_id': game_id, 'ply': ply, 'error': f"{move['from']}-{move['to']}: {msg}"}
+                    break
+                squares = (to_square(pos_to_coords(move['from'])), to_square(pos_to_coords(move['to'])))
+                yield {'game_id': game_id, 'ply': ply, 'color': color, 'packed': packed, 'move': squares}
+
+    def _submit(self, task, depth):
+        args = (task['packed'], task['color'], task['move'], depth)
+        if self.pool is not None:
+            return self.pool.submit(score_position, *args)
+        with self.lock:
+            return score_position(self.ai, *args)
+
+    def _record(self, entry, summary):
+        task, result = entry
+        best, best_score, score, nodes = result.result() if self.pool is not None else result
+        # Scores are from white's side; the loss is from the mover's
+        loss = best_score - score if task['color'] == 'w' else score - best_score
+        summary['moves'] += 1
+        summary['nodes'] += nodes
+        return {
+            'game_id': task['game_id'],
+            'ply': task['ply'],
+            'color': task['color'],
+            'move': {'from': square_to_pos(task['move'][0]), 'to': square_to_pos(task['move'][1])},
+            'best': {'from': square_to_pos(best[0]), 'to': square_to_pos(best[1])},
+            'score': score,
+            'best_score': best_score,
+            'loss': loss,
+            'verdict': verdict(loss),
+        }
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+def main():
+    parser = argparse.ArgumentParser(description='Score every move of stored games')
+    parser.add_argument('--db', default=None, help='game database (default games/games.db)')
+    parser.add_argument('--game', action='append', default=[], help='saved game id (default: all saved games)')
+    parser.add_argument('--file', action='append', default=[], help='JSON file with a move_history')
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--engine', default=None)
+    args = parser.parse_args()
+    store = None
+    if args.game or not args.file:
+        store = GameStore(args.db or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'games', 'games.db'))
+
+    def games():
+        # Histories are read one game at a time as the analyzer asks for them
+        for path in args.file:
+            with open(path, 'r') as f:
+                yield path, json.load(f)['move_history']
+        if store is not None:
+            for game_id in args.game or store.game_ids():
+                yield game_id, store.history(game_id)
+
+    if args.depth < 1:
+        parser.error('--depth must be at least 1')
+    analyzer = BatchAnalyzer(args.workers, args.engine, args.depth)
+    try:
+        for record in analyzer.analyze(games()):
+            if 'summary' in record:
+                summary = record['summary']
+                print(f"{summary['games']} games, {summary['moves']} moves, {summary['errors']} errors "
+                      f"in {summary['elapsed_s']}s: {summary['moves_per_s']} moves/s", file=sys.stderr)
+            else:
+                print(json.dumps(record), flush=True)
+    finally:
+        analyzer.close()
+        if store is not None:
+            store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,403 @@
+"""
+Benchmark module: Measures move generation throughput of the available engines,
+search effort of ChessAI and the cost of the position encodings, checks move
+generation against known perft counts, and compares a fixed set of measurements
+against a saved baseline to flag regressions.
+Run with: python bench.py movegen|search|codec|perft|regression
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from ai import ChessAI, SEARCH_COUNTERS
+from evaluation import available as batch_eval_available
+from engine import create_board, ENGINES, DEFAULT_ENGINE
+from game_state import GameState, START_FEN
+
+# Leaf counts from well-known perft positions. The engine has no castling, en passant
+# or under-promotion, so only depths where those cannot occur are listed
+PERFT_POSITIONS = [
+    ('start', START_FEN, [20, 400, 8902, 197281]),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', [46, 2079, 89890]),
+    ('endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191]),
+]
+
+# Fixed search positions for the regression suite (reached by legal random playouts; every
+# one has a legal move), so a baseline stays comparable whatever sample_positions does
+REGRESSION_FENS = [
+    'rnbqkb1r/1pppppp1/p7/7p/1P2P1n1/5N2/P1PP1P1P/RNBQKB1R w - - 0 1',
+    '3qkb1r/prp1p1Bp/n6n/1pP5/3p1Nb1/N2P2P1/PP1KPP1P/1R1Q1B1R w - - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/N7/PPPPPPPP/R1BQKBNR b - - 0 1',
+    'r1bqkbnr/3np2p/Qp4p1/1Bpp1p2/8/2P1PN1P/PP1P1PP1/RNB1K2R w - - 0 1',
+    'rnbqkb1r/Q1p1pp1p/7n/pp1p2p1/4P3/3B3N/PPPP1PPP/RNB1K2R b - - 0 1',
+    'r3kbnr/pppqp3/2np2pp/1B5Q/3P4/4P2b/PPP1N1PP/R1B1K1R1 b - - 0 1',
+    'rn2k2r/P1pp2pp/1p2pp1n/4b3/p1P3P1/NQ3P2/P2PP1B1/R1B1K1NR w - - 0 1',
+    '2b1k1n1/rppq2br/p2p1p1p/3n2P1/2B5/PPPpPP2/Q5P1/RNBK2NR w - - 0 1',
+    '2bqk2r/r1pp3p/1p5n/p1b1p2P/PnBP2p1/N3P1P1/RPP2P2/2B1K1NR b - - 0 1',
+    '1rbq2nr/p1n1p2p/1pppkb1p/5pPQ/P7/NP1PP2N/2P2P1P/1R2KB1R w - - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/6P1/PPPPPP1P/RNBQKBNR b - - 0 1',
+    '3r2kr/p1pp2pp/bpn2p1B/2bnp3/1P2P3/P1PP2P1/3KB3/RN1Q1qN1 w - - 0 1',
+    '1nbqkbr1/rp2pppp/2pp3n/p4P2/7P/1PN5/P1PPPKP1/R1BQ1BNR w - - 0 1',
+    'rnb1kbnr/1pp1qppp/p2pp3/6B1/P7/3PPN2/1PP2PPP/RN1QKB1R w - - 0 1',
+    'rnbqkbnr/ppppp3/7p/5pp1/8/2N2PP1/PPPPP2P/R1BQKBNR w - - 0 1',
+    'r1b1kbnr/2pqp1pp/2n5/pp1p1p2/P5P1/1PP1P2N/3PBP1P/RNBQKR2 b - - 0 1',
+    'rn1q1bkr/p1p1p1pp/1p1p3n/4Pp2/B2P1P2/8/PPP1N1PP/RNBQK2R w - - 0 1',
+    'rnb1kbnr/pp3ppp/3p4/2p1N1q1/8/1PP3P1/P2PPP1P/RNBQKB1R b - - 0 1',
+    'rnb1kbnr/ppp1pppp/3q4/3p4/8/4P2N/PPPPQPPP/RNB1KB1R b - - 0 1',
+    '1rb2bkr/2pqp2p/p1p5/4ppp1/3PQP1P/R7/P1P1K1P1/RNB3N1 w - - 0 1',
+]
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+# Relative slowdown (or memory growth) tolerated before a measurement counts as a regression
+TOLERANCE = 0.15
+
+def sample_positions(count=200, seed=1, max_plies=40):
+    """
+    Return a deterministic list of (board dict, color) positions from random playouts
+    of legal moves. Every position has a legal move; a playout that reaches mate or
+    stalemate is dropped.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = create_board()
+        color = 'w'
+        for _ in range(rng.randrange(max_plies)):
+            moves = board.legal_moves(color)
+            if not moves:
+                break
+            board.make_move(*rng.choice(moves))
+            color = 'b' if color == 'w' else 'w'
+        if board.legal_moves(color):
+            positions.append((board.to_dict(), color))
+    return positions
+
+def _load(engine, positions):
+    boards = []
+    for board_dict, color in positions:
+        board = create_board(engine)
+        board.from_dict(board_dict)
+        boards.append((board, color))
+    return boards
+
+def bench_movegen(positions, repeat=5):
+    """
+    Return {name: moves per second} for each engine and for the piece-object path
+    (Piece.get_legal_moves per piece, on the current array board; not the original
+    dict-of-objects board, which no longer exists).
+    """
+    results = {}
+    boards = _load(None, positions)
+
+    def piece_path():
+        count = 0
+        for board, color in boards:
+            for piece in board.all_pieces(color):
+                count += len(piece.get_legal_moves(board))
+        return count
+    results['piece objects'] = _rate(piece_path, repeat)
+    for name in ENGINES:
+        engine_boards = _load(name, positions)
+
+        def engine_path():
+            count = 0
+            for board, color in engine_boards:
+                count += len(board.generate_moves(color))
+            return count
+        results[name] = _rate(engine_path, repeat)
+    return results
+
+def _rate(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best if best else 0.0
+
+def bench_search(positions, depth=3, passes=2, engine=None, **ai_options):
+    """
+    Search every position `passes` times on engine boards with one ChessAI (built with
+    ai_options) and return per-pass totals of the ChessAI.stats counters plus seconds.
+    """
+    ai = ChessAI(**ai_options)
+    if ai.pool is not None:
+        ai.pool.start()
+    boards = _load(engine, positions)
+    results = []
+    for _ in range(passes):
+        totals = dict.fromkeys(SEARCH_COUNTERS, 0)
+        start = time.perf_counter()
+        for board, color in boards:
+            ai.search(board, color, depth)
+            for name in totals:
+                totals[name] += ai.stats.get(name, 0)
+        totals['seconds'] = time.perf_counter() - start
+        results.append(totals)
+    ai.close()
+    return results
+
+def _dict_encode(game_state):
+    return json.dumps({'board': game_state.board.to_dict(), 'turn': game_state.turn})
+
+def _dict_decode(game_state, data):
+    data = json.loads(data)
+    game_state.board.from_dict(data['board'])
+    game_state.turn = data['turn']
+
+# Positions with castling rights, en passant squares and clocks other than the defaults,
+# which sampled playout positions never have
+CODEC_FENS = [
+    'r3k2r/8/8/8/8/8/8/R3K2R w Kq - 12 40',
+    'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1',
+    'rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQk d6 0 3',
+    '4k3/8/8/8/8/8/8/4K2R b K - 99 120',
+]
+# FENs from_fen must reject: repeated castling letter, negative clocks
+BAD_FENS = [
+    'r3k2r/8/8/8/8/8/8/R3K2R w KK - 0 1',
+    'r3k2r/8/8/8/8/8/8/R3K2R w - - -3 1',
+    'r3k2r/8/8/8/8/8/8/R3K2R w - - 0 -1',
+]
+
+# name: (encode(game_state), decode(game_state, data), keeps castling/en passant/clocks)
+CODECS = {
+    'dict (json)': (_dict_encode, _dict_decode, False),
+    'fen': (GameState.to_fen, GameState.from_fen, True),
+    'packed': (GameState.to_bytes, GameState.from_bytes, True),
+}
+
+def bench_codec(positions, repeat=5):
+    """
+    Round-trip every position (plus CODEC_FENS) through each encoding, raising
+    AssertionError on a mismatch or if a BAD_FENS entry loads, and return
+    {name: (encodes per second, decodes per second, bytes per position)}.
+    """
+    states = []
+    for board_dict, color in positions:
+        game_state = GameState()
+        game_state.board.from_dict(board_dict)
+        game_state.turn = color
+        states.append(game_state)
+    for fen in CODEC_FENS:
+        game_state = GameState()
+        game_state.from_fen(fen)
+        assert game_state.to_fen() == fen, f"fen {fen} came back as {game_state.to_fen()}"
+        states.append(game_state)
+    target = GameState()
+    for fen in BAD_FENS:
+        try:
+            target.from_fen(fen)
+        except ValueError:
+            continue
+        raise AssertionError(f"from_fen accepted {fen}")
+    results = {}
+    for name, (encode, decode, complete) in CODECS.items():
+        encoded = [encode(game_state) for game_state in states]
+        for game_state, data in zip(states, encoded):
+            decode(target, data)
+            expected, actual = game_state.to_fen(), target.to_fen()
+            if not complete:
+                expected, actual = expected.split()[:2], actual.split()[:2]
+            assert expected == actual, f"{name} round trip: {game_state.to_fen()} came back as {target.to_fen()}"
+
+        def encode_all():
+            for game_state in states:
+                encode(game_state)
+            return len(states)
+
+        def decode_all():
+            for data in encoded:
+                decode(target, data)
+            return len(encoded)
+        size = sum(len(data) for data in encoded) / len(encoded)
+        results[name] = (_rate(encode_all, repeat), _rate(decode_all, repeat), size)
+    return results
+
+def perft(board, color, depth):
+    """Count the leaf nodes of the legal move tree, depth plies deep."""
+    moves = board.legal_moves(color)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    other = 'b' if color == 'w' else 'w'
+    nodes = 0
+    for move in moves:
+        undo = board.make_move(*move)
+        nodes += perft(board, other, depth - 1)
+        board.unmake_move(undo)
+    return nodes
+
+def run_perft(engine=None, max_depth=None):
+    """
+    Run perft over PERFT_POSITIONS for one engine.
+    Returns [(name, depth, expected, counted, seconds), ...].
+    """
+    results = []
+    for name, fen, expected in PERFT_POSITIONS:
+        game_state = GameState(engine)
+        game_state.from_fen(fen)
+        for depth, nodes in enumerate(expected[:max_depth], 1):
+            start = time.perf_counter()
+            counted = perft(game_state.board, game_state.turn, depth)
+            results.append((name, depth, nodes, counted, time.perf_counter() - start))
+    return results
+
+def bench_search_depths(fens, depth=3, memory_positions=5):
+    """
+    Time ChessAI.get_best_move over the FEN positions at every depth up to depth, each with a
+    fresh ChessAI. Returns {'time_to_depth_ms': {depth: ms}, 'nodes', 'nps', 'peak_kb'},
+    the last three for the deepest search; peak_kb is the tracemalloc peak of a
+    separate, untimed pass over the first memory_positions positions.
+    """
+    states = []
+    for fen in fens:
+        game_state = GameState()
+        game_state.from_fen(fen)
+        states.append(game_state)
+    times = {}
+    nodes = seconds = 0
+    for target in range(1, depth + 1):
+        ai = ChessAI()
+        nodes, seconds = 0, 0.0
+        for game_state in states:
+            start = time.perf_counter()
+            ai.get_best_move(game_state, depth=target)
+            seconds += time.perf_counter() - start
+            nodes += ai.stats['nodes']
+        times[str(target)] = round(seconds * 1000, 1)
+    tracemalloc.start()
+    ai = ChessAI()
+    for game_state in states[:memory_positions]:
+        ai.get_best_move(game_state, depth=depth)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'time_to_depth_ms': times,
+        'nodes': nodes,
+        'nps': round(nodes / seconds) if seconds else 0,
+        'peak_kb': round(peak / 1024),
+    }
+
+def measure(depth=3, positions=20):
+    """Collect the regression measurements; raises AssertionError if perft disagrees."""
+    results = {'perft_nps': {}, 'search': None, 'depth': depth, 'positions': positions}
+    for engine in ENGINES:
+        leaves = seconds = 0
+        for name, ply, expected, counted, elapsed in run_perft(engine):
+            assert counted == expected, f"{engine} perft {name} depth {ply}: {counted}, expected {expected}"
+            leaves += counted
+            seconds += elapsed
+        results['perft_nps'][engine] = round(leaves / seconds)
+    results['search'] = bench_search_depths(REGRESSION_FENS[:positions], depth)
+    return results
+
+def compare(baseline, current, tolerance=TOLERANCE):
+    """Return a list of regression messages for current against baseline."""
+    problems = []
+    if (baseline.get('depth'), baseline.get('positions')) != (current['depth'], current['positions']):
+        return [f"baseline was measured at depth {baseline.get('depth')} over {baseline.get('positions')} "
+                f"positions; re-run with those settings or save a new baseline"]
+    for engine, rate in current['perft_nps'].items():
+        old = baseline['perft_nps'].get(engine)
+        if old and rate < old * (1 - tolerance):
+            problems.append(f"perft {engine}: {rate:,} leaves/s, baseline {old:,}")
+    old, new = baseline['search'], current['search']
+    if new['nodes'] != old['nodes']:
+        problems.append(f"search visits {new['nodes']:,} nodes, baseline {old['nodes']:,} (search behaviour changed)")
+    if new['nps'] < old['nps'] * (1 - tolerance):
+        problems.append(f"search: {new['nps']:,} nodes/s, baseline {old['nps']:,}")
+    for depth, ms in new['time_to_depth_ms'].items():
+        old_ms = old['time_to_depth_ms'].get(depth)
+        if old_ms and ms > old_ms * (1 + tolerance):
+            problems.append(f"time to depth {depth}: {ms:,.1f} ms, baseline {old_ms:,.1f} ms")
+    if new['peak_kb'] > old['peak_kb'] * (1 + tolerance):
+        problems.append(f"search peak memory {new['peak_kb']:,} KB, baseline {old['peak_kb']:,} KB")
+    return problems
+
+def _print_search(label, totals):
+    cutoffs = totals['cutoffs']
+    first = totals['first_move_cutoffs'] / cutoffs if cutoffs else 0.0
+    print(f"{label:16s} {totals['nodes']:10,} nodes ({totals['qnodes']:,} quiescence)  "
+          f"{totals['seconds']:6.2f}s  cutoffs {cutoffs:,} ({first:.0%} on first move)  "
+          f"tt hits {totals['tt_hits']:,} misses {totals['tt_misses']:,}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Chess engine benchmarks')
+    parser.add_argument('suite', choices=['movegen', 'search', 'codec', 'perft', 'regression'])
+    parser.add_argument('--positions', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=0, help='root-parallel search processes')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='regression baseline file')
+    parser.add_argument('--save', action='store_true', help='store this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    if args.suite == 'perft':
+        failed = False
+        for engine in ENGINES:
+            for name, depth, expected, counted, seconds in run_perft(engine):
+                status = 'ok' if counted == expected else f'MISMATCH (expected {expected:,})'
+                failed = failed or counted != expected
+                print(f"{engine:8s} {name:10s} depth {depth}  {counted:10,} leaves  "
+                      f"{counted / seconds if seconds else 0:10,.0f}/s  {status}")
+        sys.exit(1 if failed else 0)
+    if args.suite == 'regression':
+        current = measure(args.depth, min(args.positions, len(REGRESSION_FENS)))
+        search = current['search']
+        print(f"perft {', '.join(f'{engine} {rate:,} leaves/s' for engine, rate in current['perft_nps'].items())}")
+        print(f"search {search['nodes']:,} nodes, {search['nps']:,} nodes/s, peak {search['peak_kb']:,} KB, "
+              f"time to depth {search['time_to_depth_ms']} ms")
+        if args.save:
+            with open(args.baseline, 'w') as f:
+                json.dump(current, f, indent=2)
+            print(f"baseline saved to {args.baseline}")
+            return
+        if not os.path.exists(args.baseline):
+            print(f"no baseline at {args.baseline}; run with --save to create one")
+            return
+        with open(args.baseline, 'r') as f:
+            problems = compare(json.load(f), current, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+        print("no regressions against the baseline")
+        return
+    positions = sample_positions(args.positions)
+    if args.suite == 'search':
+        positions = positions[:20]
+        first, second = bench_search(positions, depth=args.depth)
+        _print_search('ordered', first)
+        _print_search('ordered, warm TT', second)
+        if args.workers > 1:
+            _print_search(f'{args.workers} workers',
+                          bench_search(positions, depth=args.depth, passes=1, workers=args.workers)[0])
+        _print_search('unordered', bench_search(positions, depth=args.depth, passes=1, ordering=False)[0])
+        for engine in ENGINES:
+            if engine != DEFAULT_ENGINE:
+                totals = bench_search(positions, depth=args.depth, passes=1, engine=engine)[0]
+                _print_search(f'{engine} engine', totals)
+                ratio = totals['nodes'] / totals['seconds'] / (first['nodes'] / first['seconds'])
+                print(f"{'':16s} {ratio:.2f}x the {DEFAULT_ENGINE} nodes/s"
+                      f"{'' if ratio > 1 else f' (not faster; {DEFAULT_ENGINE} stays the default)'}")
+        if batch_eval_available():
+            totals = bench_search(positions, depth=args.depth, passes=1, batch_eval=True)[0]
+            _print_search('batch eval', totals)
+            print(f"{'':16s} {totals['eval_positions']:10,} leaves in {totals['eval_batches']:,} batches "
+                  f"({totals['eval_positions'] / max(1, totals['eval_batches']):.1f} per batch)")
+        return
+    if args.suite == 'codec':
+        for name, (encodes, decodes, size) in bench_codec(positions).items():
+            print(f"{name:12s} encode {encodes:10,.0f}/s  decode {decodes:10,.0f}/s  {size:6.1f} bytes")
+        return
+    results = bench_movegen(positions)
+    piece_rate = results['piece objects']
+    for name, rate in results.items():
+        print(f"{name:24s} {rate:12,.0f} moves/s  ({rate / piece_rate:.2f}x the piece-object path)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+"""
+Bitboard module: Optional move generation backend that keeps one 64-bit
+occupancy set per piece type and color alongside the mailbox.
+Bit i of every set is board square i (row * 8 + col).
+Knight, king and pawn attacks come from precomputed tables; sliding pieces
+use ray lookups cut off at the first blocker. Legal moves and perft are
+faster than the mailbox, but a search is not: make/unmake still updates the
+mailbox too, so the backend stays opt-in.
+"""
+
+from board import Board
+from piece import (KNIGHT_TARGETS, KING_TARGETS, PAWN_CAPTURES, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
+                   ROOK_DIRS, BISHOP_DIRS)
+
+FULL = (1 << 64) - 1
+
+def _mask(squares):
+    bits = 0
+    for sq in squares:
+        bits |= 1 << sq
+    return bits
+
+KNIGHT_ATTACKS = tuple(_mask(targets) for targets in KNIGHT_TARGETS)
+KING_ATTACKS = tuple(_mask(targets) for targets in KING_TARGETS)
+PAWN_ATTACKS = tuple(tuple(_mask(targets) for targets in side) for side in PAWN_CAPTURES)
+
+def _ray(sq, dr, dc):
+    r, c = divmod(sq, 8)
+    bits = 0
+    r, c = r + dr, c + dc
+    while 0 <= r < 8 and 0 <= c < 8:
+        bits |= 1 << (r * 8 + c)
+        r, c = r + dr, c + dc
+    return bits
+
+# One ray table per direction. Rays running towards higher square indices
+# stop at their lowest blocker, rays running towards lower indices at their highest.
+RAYS_S, RAYS_E, RAYS_SW, RAYS_SE, RAYS_N, RAYS_W, RAYS_NW, RAYS_NE = (
+    tuple(_ray(sq, dr, dc) for sq in range(64))
+    for dr, dc in [(1, 0), (0, 1), (1, -1), (1, 1), (-1, 0), (0, -1), (-1, -1), (-1, 1)]
+)
+ROOK_RAYS_UP, ROOK_RAYS_DOWN = (RAYS_S, RAYS_E), (RAYS_N, RAYS_W)
+BISHOP_RAYS_UP, BISHOP_RAYS_DOWN = (RAYS_SW, RAYS_SE), (RAYS_NW, RAYS_NE)
+
+def _between():
+    """BETWEEN[a][b]: squares strictly between a and b on a shared line, 0 if they share none."""
+    table = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for dr, dc in ROOK_DIRS + BISHOP_DIRS:
+            r, c = divmod(sq, 8)
+            bits = 0
+            r, c = r + dr, c + dc
+            while 0 <= r < 8 and 0 <= c < 8:
+                table[sq][r * 8 + c] = bits
+                bits |= 1 << (r * 8 + c)
+                r, c = r + dr, c + dc
+    return tuple(tuple(row) for row in table)
+
+BETWEEN = _between()
+
+# Empty-board rook and bishop reach, to skip sliders that have nothing on their lines
+ROOK_LINES = tuple(RAYS_N[sq] | RAYS_S[sq] | RAYS_E[sq] | RAYS_W[sq] for sq in range(64))
+BISHOP_LINES = tuple(RAYS_NE[sq] | RAYS_NW[sq] | RAYS_SE[sq] | RAYS_SW[sq] for sq in range(64))
+
+FILE_A = 0x0101010101010101
+FILE_H = 0x8080808080808080
+
+# Row 5 for white and row 2 for black: pawns that just made a single step from home
+DOUBLE_PUSH_ROWS = (0xFF << 40, 0xFF << 16)
+
+def _slide(sq, occupied, rays_up, rays_down):
+    attacks = 0
+    for rays in rays_up:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for rays in rays_down:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+def rook_attacks(sq, occupied):
+    """Squares a rook on sq attacks given the occupancy set."""
+    return _slide(sq, occupied, ROOK_RAYS_UP, ROOK_RAYS_DOWN)
+
+def bishop_attacks(sq, occupied):
+    """Squares a bishop on sq attacks given the occupancy set."""
+    return _slide(sq, occupied, BISHOP_RAYS_UP, BISHOP_RAYS_DOWN)
+
+def iter_bits(bits):
+    """Yield the square index of every set bit, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+class BitboardBoard(Board):
+    """Board that maintains bitboards incrementally on top of the mailbox."""
+
+    def refresh(self):
+        super().refresh()
+        self._sync()
+
+    def set_piece(self, pos, piece):
+        super().set_piece(pos, piece)
+        self._sync()
+
+    def _sync(self):
+        """Rebuild every bitboard from the mailbox."""
+        self.pieces = [0] * 13
+        self.colors = [0, 0]
+        for sq, value in enumerate(self.cells):
+            if value:
+                self.pieces[value + 6] |= 1 << sq
+                self.colors[0 if value > 0 else 1] |= 1 << sq
+
+    def make_move(self, from_sq, to_sq):
+        undo = super().make_move(from_sq, to_sq)
+        moved, captured = undo[2], undo[3]
+        from_bit, to_bit = 1 << from_sq, 1 << to_sq
+        pieces, colors = self.pieces, self.colors
+        side = 0 if moved > 0 else 1
+        pieces[moved + 6] ^= from_bit
+        pieces[self.cells[to_sq] + 6] ^= to_bit
+        colors[side] ^= from_bit | to_bit
+        if captured:
+            pieces[captured + 6] ^= to_bit
+            colors[1 - side] ^= to_bit
+        return undo
+
+    def unmake_move(self, undo):
+        from_sq, to_sq, moved, captured = undo[:4]
+        from_bit, to_bit = 1 << from_sq, 1 << to_sq
+        pieces, colors = self.pieces, self.colors
+        side = 0 if moved > 0 else 1
+        pieces[self.cells[to_sq] + 6] ^= to_bit
+        pieces[moved + 6] ^= from_bit
+        colors[side] ^= from_bit | to_bit
+        if captured:
+            pieces[captured + 6] ^= to_bit
+            colors[1 - side] ^= to_bit
+        super().unmake_move(undo)
+
+    def copy(self):
+        new_board = super().copy()
+        new_board.pieces = list(self.pieces)
+        new_board.colors = list(self.colors)
+        return new_board
+
+    def attacks_from(self, sq, value):
+        """Attack set of a piece with integer code value standing on sq."""
+        kind = value if value > 0 else -value
+        occupied = self.colors[0] | self.colors[1]
+        if kind == PAWN:
+            return PAWN_ATTACKS[0 if value > 0 else 1][sq]
+        if kind == KNIGHT:
+            return KNIGHT_ATTACKS[sq]
+        if kind == KING:
+            return KING_ATTACKS[sq]
+        attacks = 0
+        if kind in (ROOK, QUEEN):
+            attacks |= rook_attacks(sq, occupied)
+        if kind in (BISHOP, QUEEN):
+            attacks |= bishop_attacks(sq, occupied)
+        return attacks
+
+    def _attacked_squares(self, side):
+        sign = 1 if side == 0 else -1
+        pieces = self.pieces
+        occupied = self.colors[0] | self.colors[1]
+        pawns = pieces[sign * PAWN + 6]
+        if side == 0:
+            bits = ((pawns & ~FILE_A) >> 9) | ((pawns & ~FILE_H) >> 7)
+        else:
+            bits = ((pawns & ~FILE_A) << 7) | ((pawns & ~FILE_H) << 9)
+        for sq in iter_bits(pieces[sign * KNIGHT + 6]):
+            bits |= KNIGHT_ATTACKS[sq]
+        for sq in iter_bits(pieces[sign * KING + 6]):
+            bits |= KING_ATTACKS[sq]
+        for sq in iter_bits(pieces[sign * ROOK + 6] | pieces[sign * QUEEN + 6]):
+            bits |= rook_attacks(sq, occupied)
+        for sq in iter_bits(pieces[sign * BISHOP + 6] | pieces[sign * QUEEN + 6]):
+            bits |= bishop_attacks(sq, occupied)
+        return bits & FULL
+
+    def _square_attacked(self, sq, side, occupied=None):
+        sign = 1 if side == 0 else -1
+        pieces = self.pieces
+        if KNIGHT_ATTACKS[sq] & pieces[sign * KNIGHT + 6] or KING_ATTACKS[sq] & pieces[sign * KING + 6]:
+            return True
+        # A pawn of side attacks sq from the squares a pawn of the other side would capture on
+        if PAWN_ATTACKS[1 - side][sq] & pieces[sign * PAWN + 6]:
+            return True
+        if occupied is None:
+            occupied = self.colors[0] | self.colors[1]
+        queens = pieces[sign * QUEEN + 6]
+        if rook_attacks(sq, occupied) & (pieces[sign * ROOK + 6] | queens):
+            return True
+        return bool(bishop_attacks(sq, occupied) & (pieces[sign * BISHOP + 6] | queens))
+
+    def _target_set(self, sq, value, side, occupied):
+        if value == PAWN or value == -PAWN:
+            empty = ~occupied & FULL
+            bit = 1 << sq
+            if side == 0:
+                single = (bit >> 8) & empty
+                double = ((single & DOUBLE_PUSH_ROWS[0]) >> 8) & empty
+            else:
+                single = (bit << 8) & empty
+                double = ((single & DOUBLE_PUSH_ROWS[1]) << 8) & empty
+            return single | double | (PAWN_ATTACKS[side][sq] & self.colors[1 - side])
+        return self.attacks_from(sq, value) & ~self.colors[side]
+
+    def legal_moves(self, color):
+        """
+        Legal moves from the bitboards: pinned pieces stay on the line to their pinner and
+        the king only steps to squares not attacked once it has left its own square.
+        In check, every move is tried on the board instead.
+        """
+        side = 0 if color == 'w' else 1
+        king = self.kings[side]
+        if king < 0:
+            return []
+        enemy = 1 - side
+        sign = -1 if enemy else 1
+        pieces, own = self.pieces, self.colors[side]
+        occupied = own | self.colors[enemy]
+        if self._square_attacked(king, enemy, occupied):
+            return super().legal_moves(color)
+        # Enemy sliders that see the king through at most own pieces; one own piece between pins it
+        queens = pieces[sign * QUEEN + 6]
+        pinners = (rook_attacks(king, self.colors[enemy]) & (pieces[sign * ROOK + 6] | queens)
+                   | bishop_attacks(king, self.colors[enemy]) & (pieces[sign * BISHOP + 6] | queens))
+        pinned = {}
+        for sq in iter_bits(pinners):
+            between = BETWEEN[king][sq]
+            blockers = between & own
+            if blockers and not blockers & (blockers - 1):
+                pinned[blockers.bit_length() - 1] = between | 1 << sq
+        without_king = occupied ^ 1 << king
+        legal = []
+        for move in self.generate_moves(color):
+            from_sq, to_sq = move
+            if from_sq == king:
+                if self._square_attacked(to_sq, enemy, without_king):
+                    continue
+            elif from_sq in pinned and not pinned[from_sq] >> to_sq & 1:
+                continue
+            legal.append(move)
+        return legal
+
+    def piece_targets(self, sq):
+        value = self.cells[sq]
+        if not value:
+            return []
+        side = 0 if value > 0 else 1
+        occupied = self.colors[0] | self.colors[1]
+        return list(iter_bits(self._target_set(sq, value, side, occupied)))
+
+    def generate_moves(self, color):
+        return self._generate(color, False)
+
+    def generate_captures(self, color):
+        return self._generate(color, True)
+
+    def _generate(self, color, captures_only):
+        side = 0 if color == 'w' else 1
+        sign = 1 if side == 0 else -1
+        pieces = self.pieces
+        own, enemy = self.colors[side], self.colors[1 - side]
+        occupied = own | enemy
+        empty = ~occupied & FULL
+        moves = []
+        # Pawns move set-wise: shift the whole pawn set and recover each origin by offset
+        pawns = pieces[sign * PAWN + 6]
+        if side == 0:
+            single = (pawns >> 8) & empty
+            double = ((single & DOUBLE_PUSH_ROWS[0]) >> 8) & empty
+            targets = [(single, 8), (double, 16),
+                       (((pawns & ~FILE_A) >> 9) & enemy, 9), (((pawns & ~FILE_H) >> 7) & enemy, 7)]
+        else:
+            single = (pawns << 8) & empty
+            double = ((single & DOUBLE_PUSH_ROWS[1]) << 8) & empty
+            targets = [(single, -8), (double, -16),
+                       (((pawns & ~FILE_A) << 7) & enemy, -7), (((pawns & ~FILE_H) << 9) & enemy, -9)]
+        if captures_only:
+            targets = targets[2:]
+        for bits, offset in targets:
+            while bits:
+                low = bits & -bits
+                to_sq = low.bit_length() - 1
+                moves.append((to_sq + offset, to_sq))
+                bits ^= low
+        not_own = enemy if captures_only else ~own
+        # Queens go through both the rook-line and the bishop-line pass
+        queens = pieces[sign * QUEEN + 6]
+        for sources, table, lines, rays_up, rays_down in (
+                (pieces[sign * KNIGHT + 6], KNIGHT_ATTACKS, None, None, None),
+                (pieces[sign * KING + 6], KING_ATTACKS, None, None, None),
+                (pieces[sign * ROOK + 6] | queens, None, ROOK_LINES, ROOK_RAYS_UP, ROOK_RAYS_DOWN),
+                (pieces[sign * BISHOP + 6] | queens, None, BISHOP_LINES, BISHOP_RAYS_UP, BISHOP_RAYS_DOWN)):
+            while sources:
+                low = sources & -sources
+                sources ^= low
+                sq = low.bit_length() - 1
+                if table is not None:
+                    bits = table[sq] & not_own
+                elif lines[sq] & not_own:
+                    bits = _slide(sq, occupied, rays_up, rays_down) & not_own
+                else:
+                    continue
+                while bits:
+                    low = bits & -bits
+                    moves.append((sq, low.bit_length() - 1))
+                    bits ^= low
+        return moves
@@ -1,42 +1,123 @@
 """
 Board module: Defines the Board class for 8x8 chessboard,
 initializes piece positions, handles updates, and reset.
+Squares are stored as a flat 64-entry array of signed integer piece codes.
+The Zobrist hash, material + piece-square score and king squares are kept
+up to date incrementally as moves are made and unmade. Attacked-square maps
+are computed at most once per position and restored on unmake.
 """
 
-from piece import create_piece, Piece
+import random
+from array import array
+from piece import (create_piece, generate_moves, generate_captures, piece_targets, attacked_squares, square_attacked,
+                   to_square, CODE_TO_INT, PIECE_CHARS, QUEEN_LINES, PAWN, QUEEN, KING)
+from pst import SQUARE_SCORES
+
+# FEN piece placement of the start position; FEN lists rank 8 (row 0) first
+START_PLACEMENT = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR'
+
+# Packed placement: two squares per byte, (code + 6) in the high nibble for the even square
+PACKED_BOARD_SIZE = 32
+_UNPACK = [((b >> 4) - 6, (b & 15) - 6) for b in range(256)]
+
+# Attack maps of a position not computed yet (white, black)
+NO_ATTACKS = (None, None)
+
+# Zobrist keys, indexed by (integer piece code + 6) and square. Fixed seed so
+# keys are stable across processes and runs.
+_zobrist_rng = random.Random(0x5EED)
+ZOBRIST_PIECES = [[_zobrist_rng.getrandbits(64) if code != 6 else 0 for _ in range(64)] for code in range(13)]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_rng.getrandbits(64)
+
+def cell_dict(value):
+    """Frontend form of an integer piece code: {'color', 'code'}, or None for an empty square."""
+    return {'color': 'w' if value > 0 else 'b', 'code': PIECE_CHARS[value + 6]} if value else None
 
 class Board:
     def __init__(self):
-        self.squares = [[None for _ in range(8)] for _ in range(8)]
+        self.cells = array('b', bytes(64))
+        self.hash = 0
+        self.score = 0  # material + piece-square score in centipawns, white positive
+        self.kings = [-1, -1]  # king squares for white, black; -1 when captured
+        self.attacks = NO_ATTACKS  # attacked-square masks for white, black; None until needed
         self.reset()
 
     def reset(self):
         """Initialize the board with standard chess starting positions."""
-        # Place pieces for both colors
-        setup = [
-            ['R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R'],
-            ['P'] * 8,
-            [None] * 8,
-            [None] * 8,
-            [None] * 8,
-            [None] * 8,
-            ['p'] * 8,
-            ['r', 'n', 'b', 'q', 'k', 'b', 'n', 'r']
-        ]
+        self.set_placement(START_PLACEMENT)
+
+    def placement(self):
+        """Return the piece placement field of a FEN string."""
+        rows = []
         for r in range(8):
-            for c in range(8):
-                code = setup[r][c]
-                self.squares[r][c] = create_piece(code, (r, c)) if code else None
+            row, empty = '', 0
+            for value in self.cells[r * 8:r * 8 + 8]:
+                if value:
+                    if empty:
+                        row += str(empty)
+                        empty = 0
+                    row += PIECE_CHARS[value + 6]
+                else:
+                    empty += 1
+            rows.append(row + str(empty) if empty else row)
+        return '/'.join(rows)
+
+    def set_placement(self, placement):
+        """Load a FEN piece placement field. Raises ValueError if it is malformed."""
+        rows = placement.split('/')
+        if len(rows) != 8:
+            raise ValueError(f"FEN placement needs 8 ranks: {placement!r}")
+        cells = array('b', bytes(64))
+        for r, row in enumerate(rows):
+            c = 0
+            for ch in row:
+                if ch in '12345678':
+                    c += int(ch)
+                elif ch in CODE_TO_INT and c < 8:
+                    cells[r * 8 + c] = CODE_TO_INT[ch]
+                    c += 1
+                else:
+                    raise ValueError(f"Bad FEN rank {row!r}")
+            if c != 8:
+                raise ValueError(f"FEN rank {row!r} does not cover 8 files")
+        self.cells = cells
+        self.refresh()
+
+    def refresh(self):
+        """Recompute the Zobrist hash, score and king squares from scratch."""
+        h = score = 0
+        self.kings = [-1, -1]
+        for sq, value in enumerate(self.cells):
+            h ^= ZOBRIST_PIECES[value + 6][sq]
+            score += SQUARE_SCORES[value + 6][sq]
+            if value == KING or value == -KING:
+                self.kings[0 if value > 0 else 1] = sq
+        self.hash = h
+        self.score = score
+        self.attacks = NO_ATTACKS
+
+    def position_key(self, color):
+        """Zobrist key of the position with color to move."""
+        return self.hash ^ ZOBRIST_BLACK_TO_MOVE if color == 'b' else self.hash
 
     def get_piece(self, pos):
         """Get piece at board position (row, col)."""
-        r, c = pos
-        return self.squares[r][c]
+        value = self.cells[to_square(pos)]
+        return create_piece(PIECE_CHARS[value + 6], pos) if value else None
 
     def set_piece(self, pos, piece):
         """Set piece at board position (row, col)."""
         r, c = pos
-        self.squares[r][c] = piece
+        sq = r * 8 + c
+        value = CODE_TO_INT[piece.code] if piece else 0
+        old = self.cells[sq]
+        self.hash ^= ZOBRIST_PIECES[old + 6][sq] ^ ZOBRIST_PIECES[value + 6][sq]
+        self.score += SQUARE_SCORES[value + 6][sq] - SQUARE_SCORES[old + 6][sq]
+        self.cells[sq] = value
+        self.attacks = NO_ATTACKS
+        if old in (KING, -KING) or value in (KING, -KING):
+            self.kings = [self.cells.index(KING) if KING in self.cells else -1,
+                          self.cells.index(-KING) if -KING in self.cells else -1]
         if piece:
             piece.position = (r, c)
 
@@ -48,15 +129,115 @@ class Board:
         self.set_piece(from_pos, None)
         return captured
 
+    def make_move(self, from_sq, to_sq):
+        """
+        Make a move between square indices in place, promoting pawns that reach
+        the last rank. Returns an undo record for unmake_move.
+        """
+        cells = self.cells
+        moved = cells[from_sq]
+        captured = cells[to_sq]
+        old_hash, old_score, old_attacks = self.hash, self.score, self.attacks
+        self.attacks = NO_ATTACKS
+        if (moved == PAWN or moved == -PAWN) and (to_sq < 8 or to_sq >= 56):
+            placed = QUEEN if moved > 0 else -QUEEN
+        else:
+            placed = moved
+        cells[from_sq] = 0
+        cells[to_sq] = placed
+        self.hash = (old_hash ^ ZOBRIST_PIECES[moved + 6][from_sq] ^ ZOBRIST_PIECES[captured + 6][to_sq]
+                     ^ ZOBRIST_PIECES[placed + 6][to_sq])
+        self.score = (old_score - SQUARE_SCORES[moved + 6][from_sq] - SQUARE_SCORES[captured + 6][to_sq]
+                      + SQUARE_SCORES[placed + 6][to_sq])
+        if moved == KING or moved == -KING:
+            self.kings[0 if moved > 0 else 1] = to_sq
+        if captured == KING or captured == -KING:
+            self.kings[0 if captured > 0 else 1] = -1
+        return (from_sq, to_sq, moved, captured, old_hash, old_score, old_attacks)
+
+    def unmake_move(self, undo):
+        """Take back a move made with make_move, restoring captures and promotions."""
+        from_sq, to_sq, moved, captured, old_hash, old_score, old_attacks = undo
+        self.cells[from_sq] = moved
+        self.cells[to_sq] = captured
+        self.hash = old_hash
+        self.score = old_score
+        self.attacks = old_attacks
+        if moved == KING or moved == -KING:
+            self.kings[0 if moved > 0 else 1] = from_sq
+        if captured == KING or captured == -KING:
+            self.kings[0 if captured > 0 else 1] = to_sq
+
+    def piece_targets(self, sq):
+        """Return target squares for the piece on square index sq."""
+        return piece_targets(self.cells, sq)
+
+    def generate_moves(self, color):
+        """Return pseudo-legal moves [(from_sq, to_sq), ...] for color."""
+        return generate_moves(self.cells, color)
+
+    def generate_captures(self, color):
+        """Return pseudo-legal captures [(from_sq, to_sq), ...] for color."""
+        return generate_captures(self.cells, color)
+
+    def attack_map(self, color):
+        """Mask of the squares color attacks, computed once per position."""
+        side = 0 if color == 'w' else 1
+        bits = self.attacks[side]
+        if bits is None:
+            bits = self._attacked_squares(side)
+            self.attacks = (bits, self.attacks[1]) if side == 0 else (self.attacks[0], bits)
+        return bits
+
+    def _attacked_squares(self, side):
+        return attacked_squares(self.cells, side)
+
+    def is_attacked(self, sq, color):
+        """True if color attacks square sq (from the attack map when it is already known)."""
+        side = 0 if color == 'w' else 1
+        bits = self.attacks[side]
+        if bits is not None:
+            return bool(bits >> sq & 1)
+        return self._square_attacked(sq, side)
+
+    def _square_attacked(self, sq, side):
+        return square_attacked(self.cells, sq, side)
+
+    def in_check(self, color):
+        """True if color's king is attacked."""
+        king = self.kings[0 if color == 'w' else 1]
+        return king >= 0 and self.is_attacked(king, 'b' if color == 'w' else 'w')
+
+    def legal_moves(self, color):
+        """
+        Return the moves [(from_sq, to_sq), ...] that do not leave color's king attacked.
+        Only king moves, moves out of check and moves of pieces on a line with the
+        king (possible pins) are tried on the board.
+        """
+        side = 0 if color == 'w' else 1
+        king = self.kings[side]
+        if king < 0:
+            return []
+        enemy = 'b' if side == 0 else 'w'
+        in_check = self.is_attacked(king, enemy)
+        lines = QUEEN_LINES[king]
+        legal = []
+        for move in self.generate_moves(color):
+            from_sq = move[0]
+            if not in_check and from_sq != king and not lines >> from_sq & 1:
+                legal.append(move)
+                continue
+            undo = self.make_move(*move)
+            if not self.is_attacked(self.kings[side], enemy):
+                legal.append(move)
+            self.unmake_move(undo)
+        return legal
+
     def to_dict(self):
         """Return board as a serializable dict (for frontend)."""
         board_dict = []
         for r in range(8):
-            row = []
-            for c in range(8):
-                piece = self.squares[r][c]
-                row.append(piece.to_dict() if piece else None)
-            board_dict.append(row)
+            board_dict.append([cell_dict(value) for value in self.cells[r * 8:r * 8 + 8]])
         return board_dict
 
     def from_dict(self, board_dict):
@@ -64,18 +245,40 @@ class Board:
         for r in range(8):
             for c in range(8):
                 pdata = board_dict[r][c]
-                self.squares[r][c] = create_piece(pdata['code'], (r, c)) if pdata else None
+                self.cells[r * 8 + c] = CODE_TO_INT.get(pdata['code'], 0) if pdata else 0
+        self.refresh()
+
+    def to_bytes(self):
+        """Return the piece placement packed into PACKED_BOARD_SIZE bytes."""
+        cells = self.cells
+        return bytes([(cells[sq] + 6) << 4 | (cells[sq + 1] + 6) for sq in range(0, 64, 2)])
+
+    def from_bytes(self, data):
+        """Load a piece placement produced by to_bytes."""
+        if len(data) != PACKED_BOARD_SIZE:
+            raise ValueError(f"Packed board must be {PACKED_BOARD_SIZE} bytes")
+        cells = []
+        for b in data:
+            cells.extend(_UNPACK[b])
+        self.cells = array('b', cells)
+        self.refresh()
+
+    def king_captured(self):
+        """True once either king has left the board."""
+        return self.kings[0] < 0 or self.kings[1] < 0
 
     def all_pieces(self, color=None):
         """Yield all pieces, optionally filtered by color."""
-        for r in range(8):
-            for c in range(8):
-                piece = self.squares[r][c]
-                if piece and (color is None or piece.color == color):
-                    yield piece
+        for sq, value in enumerate(self.cells):
+            if value and (color is None or (value > 0) == (color == 'w')):
+                yield create_piece(PIECE_CHARS[value + 6], divmod(sq, 8))
 
     def copy(self):
-        """Return a deep copy of the board."""
-        new_board = Board()
-        new_board.squares = [[p.copy() if p else None for p in row] for row in self.squares]
+        """Return a copy of the board."""
+        new_board = self.__class__.__new__(self.__class__)
+        new_board.cells = array('b', self.cells)
+        new_board.hash = self.hash
+        new_board.score = self.score
+        new_board.kings = list(self.kings)
+        new_board.attacks = self.attacks
         return new_board
\ No newline at end of file
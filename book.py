@@ -0,0 +1,208 @@
+"""
+Book module: Opening book compiled offline from a move list or PGN corpus.
+The book file is a header followed by fixed-size (position key, move, weight)
+entries sorted by key. OpeningBook mmaps the file and binary-searches it, so
+a lookup touches a handful of pages and the book costs almost no resident memory.
+Build with: python book.py build openings.pgn games/book.bin
+"""
+
+import argparse
+import mmap
+import os
+import random
+import re
+import struct
+from collections import Counter
+from game_state import GameState
+from piece import to_square, pos_to_coords, square_to_pos, PIECE_CHARS
+
+MAGIC = b'CHSBOOK1'
+# Zobrist position key (side to move included), move as from_sq << 6 | to_sq, weight
+ENTRY = struct.Struct('>QHH')
+KEY = struct.Struct('>Q')
+MAX_WEIGHT = 0xFFFF
+
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=([NBRQ]))?$')
+COORD_PATTERN = re.compile(r'^([a-h][1-8])-?([a-h][1-8])([nbrq])?$')
+RESULTS = {'1-0', '0-1', '1/2-1/2', '*'}
+
+def parse_move(game_state, token):
+    """
+    Resolve a SAN ('Nf3', 'exd5', 'e8=Q') or coordinate ('g1f3') move against the
+    legal moves of game_state. Returns (from_pos, to_pos), or None if the move is
+    not playable here (castling, under-promotion, illegal or ambiguous).
+    """
+    token = token.rstrip('+#!?')
+    legal = game_state.legal_moves()
+    match = COORD_PATTERN.match(token)
+    if match:
+        from_pos, to_pos, promotion = match.groups()
+        if promotion and promotion != 'q' or to_pos not in legal.get(from_pos, ()):
+            return None
+        return from_pos, to_pos
+    match = SAN_PATTERN.match(token)
+    if not match:
+        return None
+    kind, from_file, from_rank, to_pos, promotion = match.groups()
+    if promotion and promotion != 'Q':
+        return None
+    kind = kind or 'P'
+    cells = game_state.board.cells
+    candidates = []
+    for from_pos, targets in legal.items():
+        value = cells[to_square(pos_to_coords(from_pos))]
+        if PIECE_CHARS[value + 6].upper() != kind or to_pos not in targets:
+            continue
+        if from_file and from_pos[0] != from_file or from_rank and from_pos[1] != from_rank:
+            continue
+        candidates.append((from_pos, to_pos))
+    return candidates[0] if len(candidates) == 1 else None
+
+def read_games(text):
+    """Split a PGN or move-list corpus into lists of move tokens, one list per game."""
+    # Drop tag pairs, comments, variations and NAGs; a result token or a blank line ends a game
+    text = re.sub(r'\[[^\]]*\]', '\n', text)
+    text = re.sub(r'\{[^}]*\}|;[^\n]*', ' ', text)
+    while '(' in text:
+        stripped = re.sub(r'\([^()]*\)', ' ', text)
+        if stripped == text:
+            break
+        text = stripped
+    games, moves = [], []
+    for line in text.splitlines():
+        if not line.strip() and moves:
+            games.append(moves)
+            moves = []
+        for token in line.split():
+            if token in RESULTS:
+                if moves:
+                    games.append(moves)
+                moves = []
+                continue
+            token = re.sub(r'^\d+\.(\.\.)?', '', token)
+            if token and not token.startswith('$'):
+                moves.append(token)
+    if moves:
+        games.append(moves)
+    return games
+
+def build_book(games, path, max_plies=24):
+    """
+    Compile games (lists of move tokens) into a book file at path, counting how often
+    each move was played from each position within the first max_plies plies.
+    A game stops at its first move the engine cannot play (e.g. castling).
+    Returns the number of entries written.
+    """
+    counts = Counter()
+    game_state = GameState()
+    for moves in games:
+        game_state.reset()
+        for token in moves[:max_plies]:
+            move = parse_move(game_state, token)
+            if move is None:
+                break
+            from_sq, to_sq = (to_square(pos_to_coords(pos)) for pos in move)
+            counts[(game_state.board.position_key(game_state.turn), from_sq << 6 | to_sq)] += 1
+            game_state.make_move(*move)
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        for (key, move), weight in sorted(counts.items()):
+            f.write(ENTRY.pack(key, move, min(weight, MAX_WEIGHT)))
+    return len(counts)
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an opening book")
+            # Zero-length files cannot be mapped; a book without entries needs no map
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if f.seek(0, 2) > len(MAGIC) else b''
+        self.count = max(0, len(self.data) - len(MAGIC)) // ENTRY.size
+
+    def lookup(self, key):
+        """Return [((from_sq, to_sq), weight), ...] for the position key, or []."""
+        data, offset, size = self.data, len(MAGIC), ENTRY.size
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if KEY.unpack_from(data, offset + mid * size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        entries = []
+        for index in range(lo, self.count):
+            entry_key, move, weight = ENTRY.unpack_from(data, offset + index * size)
+            if entry_key != key:
+                break
+            entries.append(((move >> 6, move & 63), weight))
+        return entries
+
+    def choose(self, board, color, rng=random):
+        """
+        Pick a book move for color, weighted by how often it was played, or None.
+        Moves that are not legal on board (a key collision) are ignored.
+        """
+        entries = self.lookup(board.position_key(color))
+        if not entries:
+            return None
+        legal = set(board.legal_moves(color))
+        entries = [(move, weight) for move, weight in entries if move in legal]
+        if not entries:
+            return None
+        return rng.choices([move for move, _ in entries], [weight for _, weight in entries])[0]
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __len__(self):
+        return self.count
+
+def open_book(path, corpus=None):
+    """
+    Open the book at path, first compiling it from corpus if the book file is missing.
+    Returns None when there is neither a book nor a corpus.
+    """
+    if not os.path.exists(path):
+        if corpus is None or not os.path.exists(corpus):
+            return None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(corpus, 'r') as f:
+            games = read_games(f.read())
+        # Build beside the target and rename, so a concurrent reader never maps a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        build_book(games, tmp_path)
+        os.replace(tmp_path, path)
+    return OpeningBook(path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Opening book tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='compile a PGN or move-list corpus')
+    build.add_argument('corpus')
+    build.add_argument('book')
+    build.add_argument('--max-plies', type=int, default=24)
+    probe = sub.add_parser('probe', help='list the book moves after a sequence of moves')
+    probe.add_argument('book')
+    probe.add_argument('moves', nargs='*')
+    args = parser.parse_args()
+    if args.command == 'build':
+        with open(args.corpus, 'r') as f:
+            games = read_games(f.read())
+        count = build_book(games, args.book, args.max_plies)
+        print(f"{len(games)} games, {count} entries written to {args.book}")
+        return
+    game_state = GameState()
+    for token in args.moves:
+        move = parse_move(game_state, token)
+        if move is None:
+            parser.error(f"cannot play {token}")
+        game_state.make_move(*move)
+    book = OpeningBook(args.book)
+    for (from_sq, to_sq), weight in book.lookup(game_state.board.position_key(game_state.turn)):
+        print(f"{square_to_pos(from_sq)}{square_to_pos(to_sq)} {weight}")
+    book.close()
+
+if __name__ == '__main__':
+    main()
@@ -3,61 +3,128 @@ Coach module: Analyzes player moves, identifies mistakes, and provides suggestio
 Returns JSON for thought bubbles.
 """
 
-import asyncio
 from ai import ChessAI
-from piece import pos_to_coords, coords_to_pos
+from piece import pos_to_coords, coords_to_pos, to_square, square_to_pos
 
 class Coach:
-    def __init__(self):
-        self.ai = ChessAI()
+    def __init__(self, engine=None, time_ms=None, analysis=None, ai=None, book=None, tablebases=None):
+        # Sharing an AnalysisCache with the game AI lets either answer from the other's searches.
+        # Per-game coaches pass one shared ChessAI so they do not each carry a transposition table.
+        self.ai = ai if ai is not None else ChessAI(engine, analysis=analysis)
+        # Default search budget in milliseconds; None searches to a fixed depth
+        self.time_ms = time_ms
+        # Optional OpeningBook; book moves are suggested without a search
+        self.book = book
+        # Optional Tablebases; covered endings are explained and suggested without a search
+        self.tablebases = tablebases
         self.last_feedback = []
 
-    async def analyze_move(self, game_state, from_sq, to_sq, color):
+    def analyze_move(self, game_state, from_sq, to_sq, color, time_ms=None):
         """
         Analyze the player's move, identify mistakes, and provide suggestions.
-        Returns a list of feedback strings.
+        Returns a list of feedback strings. Runs a search, so the server calls it
+        on its search executor.
         """
-        await asyncio.sleep(0.05)
         feedback = []
         # Simple mistake: moving into danger (piece can be captured next turn)
+        board = game_state.board
         from_coords = pos_to_coords(from_sq)
         to_coords = pos_to_coords(to_sq)
-        piece = game_state.board.get_piece(to_coords)
+        piece = board.get_piece(to_coords)
         if not piece:
             return []
-        # Check if the moved piece is now attacked
+        # Both checks read the side's attack maps, computed once for this position
         opp_color = 'b' if color == 'w' else 'w'
-        for opp_piece in game_state.board.all_pieces(opp_color):
-            if to_coords in opp_piece.get_legal_moves(game_state.board):
-                feedback.append(f"Careful! Your {self.piece_name(piece)} on {to_sq} can be captured.")
-                break
+        attacked = board.attack_map(opp_color)
+        target = to_square(to_coords)
+        if piece.color == color and attacked >> target & 1 and not board.attack_map(color) >> target & 1:
+            feedback.append(f"Careful! Your {self.piece_name(piece)} on {to_sq} can be captured.")
         # Check if move exposes king
-        king = next((p for p in game_state.board.all_pieces(color) if p.code.upper() == 'K'), None)
-        if king:
-            for opp_piece in game_state.board.all_pieces(opp_color):
-                if king.position in opp_piece.get_legal_moves(game_state.board):
-                    feedback.append("Warning: Your king is in danger!")
-                    break
+        king = board.kings[0 if color == 'w' else 1]
+        if king >= 0 and attacked >> king & 1:
+            feedback.append("Warning: Your king is in danger!")
+        # Explain where color's own move left a tablebase ending
+        note = self.ending_note(game_state, color) if piece.color == color else None
+        if note:
+            feedback.append(note)
         # Suggest a better move (if any)
-        best_from, best_to = await self.ai.get_best_move(game_state, depth=2)
+        best_from, best_to, reason = self.best_move(game_state, time_ms)
         if best_from and best_to and (from_sq != best_from or to_sq != best_to):
-            feedback.append(f"Try {self.move_hint(best_from, best_to)} next time for a stronger position.")
+            feedback.append(f"Try {self.move_hint(best_from, best_to)} next time, {reason or 'for a stronger position'}.")
         self.last_feedback = feedback
         return feedback
 
-    async def get_suggestions(self, game_state):
+    def get_suggestions(self, game_state, time_ms=None):
         """
         Return up to 3 suggestions for thought bubbles.
         """
-        await asyncio.sleep(0.05)
         # If last feedback exists, use it; otherwise, suggest a move
         if self.last_feedback:
             return self.last_feedback[:3]
         color = game_state.turn
-        best_from, best_to = await self.ai.get_best_move(game_state, depth=2)
+        suggestions = []
+        best_from, best_to, reason = self.best_move(game_state, time_ms)
         if best_from and best_to:
-            return [f"Consider {self.move_hint(best_from, best_to)}!"]
-        return ["Keep going!"]
+            if reason:
+                suggestions.append(f"Consider {self.move_hint(best_from, best_to)}, {reason}!")
+            else:
+                suggestions.append(f"Consider {self.move_hint(best_from, best_to)}!")
+        note = self.ending_note(game_state, color)
+        if note:
+            suggestions.append(note)
+        return suggestions or ["Keep going!"]
+
+    def best_move(self, game_state, time_ms=None):
+        """
+        Return (from_pos, to_pos, reason) for the side to move: a book or tablebase move
+        with a short reason for it, else the AI's choice with reason None.
+        """
+        board, color = game_state.board, game_state.turn
+        if self.book is not None:
+            move = self.book.choose(board, color)
+            if move is not None:
+                return square_to_pos(move[0]), square_to_pos(move[1]), "a well-known opening move"
+        if self.tablebases is not None:
+            probe = self.tablebases.best_move(board, color)
+            if probe is not None:
+                (from_sq, to_sq), result, plies = probe
+                if result == 'win':
+                    reason = f"which mates in {self.moves_to_mate(plies)}"
+                elif result == 'draw':
+                    reason = "which holds the draw"
+                else:
+                    reason = "which holds out longest"
+                return square_to_pos(from_sq), square_to_pos(to_sq), reason
+        best_from, best_to = self.ai.get_best_move(game_state, **self.search_budget(time_ms))
+        return best_from, best_to, None
+
+    def ending_note(self, game_state, color):
+        """Explain a tablebase ending from color's point of view, or return None."""
+        if self.tablebases is None:
+            return None
+        probe = self.tablebases.probe(game_state.board, game_state.turn)
+        if probe is None:
+            return None
+        result, plies = probe
+        if result == 'draw':
+            return "This ending is a draw with best play."
+        # The result is for the side to move; flip it when that is color's opponent
+        if (result == 'win') == (game_state.turn == color):
+            return f"This ending is won: mate in {self.moves_to_mate(plies)} with best play."
+        return f"This ending is lost with best play: mate in {self.moves_to_mate(plies)}."
+
+    def moves_to_mate(self, plies):
+        """Return '3 moves' for a mate plies half-moves away."""
+        moves = (plies + 1) // 2
+        return f"{moves} move" if moves == 1 else f"{moves} moves"
+
+    def search_budget(self, time_ms=None):
+        """Search arguments for ChessAI: a time budget if one is set, else a fixed depth."""
+        if time_ms is None:
+            time_ms = self.time_ms
+        if time_ms is None:
+            return {'depth': 2}
+        return {'depth': None, 'time_ms': time_ms}
 
     def piece_name(self, piece):
         """Return human-readable piece name."""
@@ -0,0 +1,26 @@
+"""
+Engine module: Registry of selectable board/move generation backends.
+'mailbox' is the array-backed Board; 'bitboard' keeps bitboards alongside it.
+"""
+
+from board import Board
+from bitboard import BitboardBoard
+
+ENGINES = {
+    'mailbox': Board,
+    'bitboard': BitboardBoard,
+}
+DEFAULT_ENGINE = 'mailbox'
+
+def create_board(engine=None, source=None):
+    """Create a board for the named engine, optionally copying the position of source."""
+    cls = ENGINES.get(engine or DEFAULT_ENGINE)
+    if cls is None:
+        raise ValueError(f"Unknown engine '{engine}'. Choose from: {', '.join(ENGINES)}")
+    if source is None:
+        return cls()
+    if type(source) is cls:
+        return source.copy()
+    board = cls()
+    board.from_dict(source.to_dict())
+    return board
@@ -0,0 +1,138 @@
+"""
+Evaluation module: Scores many positions at once with NumPy. Positions are
+stacked as rows of 64 int8 piece codes and every term is an array operation
+over the whole batch: material and piece-square scores, mobility, pawn
+structure (doubled, isolated and passed pawns) and the pawn shield in front
+of each king. The search gathers sibling leaves and scores them in one call.
+NumPy is optional; without it ChessAI keeps the board's incremental score.
+"""
+
+from piece import KNIGHT, BISHOP, ROOK, QUEEN, KING, PAWN, ROOK_DIRS, BISHOP_DIRS, KNIGHT_TARGETS
+from pst import SQUARE_SCORES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Centipawns per empty square a piece reaches (knight jumps; rook-line and bishop-line rays)
+KNIGHT_MOBILITY = 4
+ROOK_LINE_MOBILITY = {ROOK: 2, QUEEN: 1}
+BISHOP_LINE_MOBILITY = {BISHOP: 4, QUEEN: 1}
+DOUBLED_PAWN = -15
+ISOLATED_PAWN = -12
+# Passed pawn bonus indexed by rows left to promote
+PASSED_PAWN = (0, 60, 40, 25, 15, 10, 5, 0)
+# Bonus per own pawn on the three squares in front of a king on its two home rows
+KING_SHIELD = 10
+
+# Every position row gets a 65th cell holding PAD_CODE, which is neither empty nor a pawn;
+# table entries that point off the board or past the end of a ray point at it
+PAD = 64
+PAD_CODE = 7
+PAD_BYTE = bytes([PAD_CODE])
+WHITE_SIDE, BLACK_SIDE = 0, 1
+
+def available():
+    return np is not None
+
+def _ray_index():
+    """(64, 8, 8) squares along each rook then bishop direction, nearest first, padded with PAD."""
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        rays = []
+        for dr, dc in ROOK_DIRS + BISHOP_DIRS:
+            ray = []
+            nr, nc = r + dr, c + dc
+            while 0 <= nr < 8 and 0 <= nc < 8:
+                ray.append(nr * 8 + nc)
+                nr += dr
+                nc += dc
+            rays.append(ray + [PAD] * (8 - len(ray)))
+        table.append(rays)
+    return np.array(table, dtype=np.intp)
+
+def _square_matrix(related):
+    """(65, 64) 0/1 matrix with [other, sq] set for each other in related(sq); row PAD stays empty."""
+    matrix = np.zeros((PAD + 1, 64), dtype=np.float32)
+    for sq in range(64):
+        for other in related(sq):
+            matrix[other, sq] = 1
+    return matrix
+
+def _front_span(step):
+    """Squares on the same and adjacent files ahead of a pawn moving by step rows."""
+    def span(sq):
+        r, c = divmod(sq, 8)
+        return [nr * 8 + nc for nr in range(r + step, 8 if step > 0 else -1, step)
+                for nc in (c - 1, c, c + 1) if 0 <= nc < 8]
+    return span
+
+def _shield(step, home_rows):
+    """The three squares in front of a king on one of its home rows, nothing elsewhere."""
+    def shield(sq):
+        r, c = divmod(sq, 8)
+        if r not in home_rows:
+            return []
+        return [(r + step) * 8 + nc for nc in (c - 1, c, c + 1) if 0 <= nc < 8]
+    return shield
+
+class BatchEvaluator:
+    def __init__(self):
+        if np is None:
+            raise RuntimeError("BatchEvaluator needs NumPy")
+        self.squares = np.arange(64)
+        self.square_scores = np.array(SQUARE_SCORES, dtype=np.int32)
+        self.rays = _ray_index()
+        self.knights = np.array([list(targets) + [PAD] * (8 - len(targets)) for targets in KNIGHT_TARGETS],
+                                dtype=np.intp)
+        # Signed weights per (piece code + 6): per rook then bishop direction, and per knight jump
+        self.ray_weights = np.zeros((13, 8), dtype=np.int32)
+        self.knight_weights = np.zeros(13, dtype=np.int32)
+        for sign in (1, -1):
+            for kind in (BISHOP, ROOK, QUEEN):
+                self.ray_weights[sign * kind + 6] = sign * np.array(
+                    [ROOK_LINE_MOBILITY.get(kind, 0)] * 4 + [BISHOP_LINE_MOBILITY.get(kind, 0)] * 4)
+            self.knight_weights[sign * KNIGHT + 6] = sign * KNIGHT_MOBILITY
+        self.mobile = (self.ray_weights != 0).any(axis=1) | (self.knight_weights != 0)
+        # Pawn matrices (rows are pawn squares plus PAD): the file of each square, and per side
+        # (white, black) the enemy pawns stopping a pawn from being passed and the pawns shielding a king
+        self.files = np.zeros((PAD + 1, 8), dtype=np.float32)
+        self.files[self.squares, self.squares % 8] = 1
+        self.neighbours = (np.eye(8, k=1) + np.eye(8, k=-1)).astype(np.float32)
+        self.spans = np.stack([_square_matrix(_front_span(-1)), _square_matrix(_front_span(1))])
+        rows = self.squares // 8
+        self.passed_bonus = np.array(PASSED_PAWN, dtype=np.float32)[np.stack([rows, 7 - rows])]
+        self.shields = np.stack([_square_matrix(_shield(-1, (6, 7))), _square_matrix(_shield(1, (0, 1)))])
+
+    def evaluate(self, positions):
+        """Return the scores (centipawns, white positive) of positions, a list of 64-byte cell strings."""
+        padded = np.frombuffer(PAD_BYTE.join(positions) + PAD_BYTE, dtype=np.int8).reshape(-1, PAD + 1)
+        codes = padded[:, :64].astype(np.intp) + 6
+        score = self.square_scores[codes, self.squares].sum(axis=1, dtype=np.int64)
+        score += self._mobility(padded, codes)
+        # Pawn and king terms for both sides at once: index 0 is white, 1 is black
+        pawns = np.stack([padded == PAWN, padded == -PAWN]).astype(np.float32)
+        kings = np.stack([padded[:, :64] == KING, padded[:, :64] == -KING])
+        files = pawns @ self.files
+        isolated = (files * ((files > 0).astype(np.float32) @ self.neighbours == 0)).sum(axis=2)
+        doubled = np.maximum(files - 1, 0).sum(axis=2)
+        # A pawn is passed when no enemy pawn stands in its front span
+        passed = ((pawns[::-1] @ self.spans == 0) * pawns[:, :, :64] * self.passed_bonus[:, None]).sum(axis=2)
+        shield = ((pawns @ self.shields) * kings).sum(axis=2)
+        sides = DOUBLED_PAWN * doubled + ISOLATED_PAWN * isolated + passed + KING_SHIELD * shield
+        score += (sides[WHITE_SIDE] - sides[BLACK_SIDE]).astype(np.int64)
+        return score.tolist()
+
+    def _mobility(self, padded, codes):
+        # Only the (position, square) pairs holding a knight or slider are looked at
+        rows, squares = np.nonzero(self.mobile[codes])
+        codes = codes[rows, squares]
+        empty = (padded == 0).ravel()
+        base = rows * (PAD + 1)
+        # Every ray ends on PAD, so the first non-empty entry is the number of empty squares before it
+        reach = empty.take(base[:, None, None] + self.rays[squares]).argmin(axis=2)
+        jumps = empty.take(base[:, None] + self.knights[squares]).sum(axis=1)
+        values = (self.ray_weights[codes] * reach).sum(axis=1) + self.knight_weights[codes] * jumps
+        return np.bincount(rows, values, minlength=len(padded)).astype(np.int64)
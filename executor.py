@@ -0,0 +1,48 @@
+"""
+Executor module: Runs CPU-heavy request work (AI and coach searches) on a
+bounded pool of threads, so the request path only awaits the result.
+At most max_pending jobs may be queued or running; beyond that submit
+raises ServerBusy and the caller answers 503 instead of piling up work.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class ServerBusy(Exception):
+    """Raised when the executor already holds max_pending jobs."""
+
+class SearchExecutor:
+    def __init__(self, threads=2, max_pending=16):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='search')
+        self.max_pending = max_pending
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.stats = {'submitted': 0, 'rejected': 0, 'completed': 0}
+
+    def submit(self, fn, *args):
+        """Queue fn(*args) and return its concurrent Future, or raise ServerBusy."""
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.stats['rejected'] += 1
+            raise ServerBusy()
+        with self.lock:
+            self.pending += 1
+            self.stats['submitted'] += 1
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    async def run(self, fn, *args):
+        """Await fn(*args) on the executor without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def _done(self, future):
+        with self.lock:
+            self.pending -= 1
+            self.stats['completed'] += 1
+        self.slots.release()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -1,22 +1,51 @@
 """
 Game State module: Tracks game state (turn, positions, move history),
-supports saving/loading as JSON.
+supports saving/loading as JSON, FEN strings and a fixed-size binary record.
 """
 
-from board import Board
-from piece import pos_to_coords, coords_to_pos
+import os
+import struct
+import threading
+from collections import OrderedDict
+from engine import create_board
+from piece import pos_to_coords, coords_to_pos, to_square, square_to_pos, PIECE_CHARS
+from board import PACKED_BOARD_SIZE, cell_dict
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# Castling rights lost when a piece leaves or arrives on each square
+CASTLING_SQUARES = {'e1': 'KQ', 'h1': 'K', 'a1': 'Q', 'e8': 'kq', 'h8': 'k', 'a8': 'q'}
+CASTLING_BITS = 'KQkq'
+
+# Packed position: placement, flags (bit 0 black to move, bits 1-4 KQkq),
+# en passant square (64 for none), halfmove clock, fullmove number
+PACKED_FORMAT = struct.Struct(f'>{PACKED_BOARD_SIZE}sBBHH')
+PACKED_SIZE = PACKED_FORMAT.size
+NO_SQUARE = 64
+
+# Positions kept per game for answering delta requests; older clients get the full state
+RECENT_POSITIONS = 8
+
+# Legal-move maps by (placement, side to move), shared by all games
+LEGAL_MOVE_CACHE_SIZE = 4096
+_legal_move_cache = OrderedDict()
+_legal_move_lock = threading.Lock()
 
 class GameState:
-    def __init__(self):
-        self.board = Board()
+    def __init__(self, engine=None):
+        self.engine = engine
+        self.board = create_board(engine)
         self.turn = 'w'  # 'w' or 'b'
         self.move_history = []  # List of {'from': 'e2', 'to': 'e4', 'piece': 'P', 'captured': 'p'}
+        self.castling = 'KQkq'  # remaining castling rights in FEN order, '' for none
+        self.en_passant = None  # square behind a pawn that just advanced two, e.g. 'e3'
+        self.halfmove_clock = 0  # plies since the last capture or pawn move
+        self.fullmove_number = 1
+        self.restart_versions()
 
     def reset(self):
         """Reset the game to initial state."""
-        self.board.reset()
-        self.turn = 'w'
-        self.move_history = []
+        self.from_fen(START_FEN)
 
     def make_move(self, from_pos, to_pos):
         """Attempt to make a move. Returns (success, message)."""
@@ -27,38 +56,179 @@ class GameState:
             return False, "No piece at source."
         if piece.color != self.turn:
             return False, "Not your turn."
-        legal_moves = piece.get_legal_moves(self.board)
-        if to_coords not in legal_moves:
+        if coords_to_pos(to_coords) not in self.legal_moves().get(coords_to_pos(from_coords), ()):
             return False, "Illegal move."
-        captured = self.board.move_piece(from_coords, to_coords)
-        # Pawn promotion (simple: always to Queen)
-        if piece.code.upper() == 'P' and (to_coords[0] == 0 or to_coords[0] == 7):
-            from piece import Queen
-            self.board.set_piece(to_coords, Queen(piece.color, to_coords, 'Q' if piece.color == 'w' else 'q'))
+        # Pawn promotion is handled by the board (simple: always to Queen)
+        captured = self.board.make_move(to_square(from_coords), to_square(to_coords))[3]
+        from_name, to_name = coords_to_pos(from_coords), coords_to_pos(to_coords)
         self.move_history.append({
-            'from': coords_to_pos(from_coords),
-            'to': coords_to_pos(to_coords),
+            'from': from_name,
+            'to': to_name,
             'piece': piece.code,
-            'captured': captured.code if captured else None
+            'captured': PIECE_CHARS[captured + 6] if captured else None
         })
+        is_pawn = piece.code.upper() == 'P'
+        self.halfmove_clock = 0 if is_pawn or captured else self.halfmove_clock + 1
+        if is_pawn and abs(from_coords[0] - to_coords[0]) == 2:
+            self.en_passant = coords_to_pos(((from_coords[0] + to_coords[0]) // 2, from_coords[1]))
+        else:
+            self.en_passant = None
+        for name in (from_name, to_name):
+            for right in CASTLING_SQUARES.get(name, ''):
+                self.castling = self.castling.replace(right, '')
+        if self.turn == 'b':
+            self.fullmove_number += 1
         self.turn = 'b' if self.turn == 'w' else 'w'
+        self._remember_position()
         return True, "Move made."
 
     def is_game_over(self):
-        """Check if the game is over (simple: king captured)."""
-        kings = [p for p in self.board.all_pieces() if p.code.upper() == 'K']
-        return len(kings) < 2
+        """Check if the game is over: checkmate, stalemate or (from an odd position) a king missing."""
+        return self.board.king_captured() or not self.legal_moves()
+
+    def status(self):
+        """'checkmate', 'stalemate', 'check' or 'playing', for the side to move."""
+        if self.board.king_captured():
+            return 'checkmate'
+        in_check = self.board.in_check(self.turn)
+        if not self.legal_moves():
+            return 'checkmate' if in_check else 'stalemate'
+        return 'check' if in_check else 'playing'
+
+    def to_fen(self):
+        """Return the position as a FEN string."""
+        return ' '.join([self.board.placement(), self.turn, self.castling or '-', self.en_passant or '-',
+                         str(self.halfmove_clock), str(self.fullmove_number)])
+
+    def from_fen(self, fen):
+        """
+        Load a position from a FEN string (the clock fields may be omitted).
+        Clears the move history. Raises ValueError if the FEN is malformed.
+        """
+        fields = fen.split()
+        if len(fields) not in (4, 6):
+            raise ValueError(f"FEN needs 4 or 6 fields: {fen!r}")
+        placement, turn, castling, en_passant = fields[:4]
+        if turn not in ('w', 'b'):
+            raise ValueError(f"Bad side to move {turn!r}")
+        if castling != '-' and (not castling or any(ch not in CASTLING_BITS for ch in castling)
+                                or len(set(castling)) != len(castling)):
+            raise ValueError(f"Bad castling field {castling!r}")
+        if en_passant != '-' and (len(en_passant) != 2 or en_passant[0] not in 'abcdefgh' or en_passant[1] not in '36'):
+            raise ValueError(f"Bad en passant square {en_passant!r}")
+        try:
+            halfmove, fullmove = (int(fields[4]), int(fields[5])) if len(fields) == 6 else (0, 1)
+        except ValueError:
+            raise ValueError(f"Bad move counters in {fen!r}")
+        if halfmove < 0 or fullmove < 0:
+            raise ValueError(f"Negative move counters in {fen!r}")
+        self.board.set_placement(placement)
+        self.turn = turn
+        self.castling = ''.join(ch for ch in CASTLING_BITS if ch in castling)
+        self.en_passant = None if en_passant == '-' else en_passant
+        self.halfmove_clock = halfmove
+        self.fullmove_number = fullmove
+        self.move_history = []
+        self.restart_versions()
+
+    def to_bytes(self):
+        """Pack the position (not the move history) into PACKED_SIZE bytes."""
+        flags = 1 if self.turn == 'b' else 0
+        for bit, right in enumerate(CASTLING_BITS):
+            if right in self.castling:
+                flags |= 2 << bit
+        en_passant = to_square(pos_to_coords(self.en_passant)) if self.en_passant else NO_SQUARE
+        return PACKED_FORMAT.pack(self.board.to_bytes(), flags, en_passant,
+                                  min(self.halfmove_clock, 0xFFFF), min(self.fullmove_number, 0xFFFF))
+
+    def from_bytes(self, data):
+        """Load a position produced by to_bytes. Clears the move history."""
+        placement, flags, en_passant, halfmove, fullmove = PACKED_FORMAT.unpack(data)
+        self.board.from_bytes(placement)
+        self.turn = 'b' if flags & 1 else 'w'
+        self.castling = ''.join(right for bit, right in enumerate(CASTLING_BITS) if flags & (2 << bit))
+        self.en_passant = coords_to_pos(divmod(en_passant, 8)) if en_passant != NO_SQUARE else None
+        self.halfmove_clock = halfmove
+        self.fullmove_number = fullmove
+        self.move_history = []
+        self.restart_versions()
+
+    def legal_moves(self):
+        """
+        Return {from_square: [to_square, ...]} in algebraic notation for the side to move.
+        Maps are cached by position, so replies to the same position are computed once.
+        """
+        key = (self.board.cells.tobytes(), self.turn)
+        with _legal_move_lock:
+            moves = _legal_move_cache.get(key)
+            if moves is not None:
+                _legal_move_cache.move_to_end(key)
+                return moves
+        moves = {}
+        for from_sq, to_sq in self.board.legal_moves(self.turn):
+            moves.setdefault(square_to_pos(from_sq), []).append(square_to_pos(to_sq))
+        with _legal_move_lock:
+            _legal_move_cache[key] = moves
+            if len(_legal_move_cache) > LEGAL_MOVE_CACHE_SIZE:
+                _legal_move_cache.popitem(last=False)
+        return moves
+
+    @property
+    def version(self):
+        """Opaque client version: the epoch plus the number of moves made in it."""
+        return f"{self.epoch}.{len(self.move_history)}"
+
+    def restart_versions(self):
+        """
+        Start a new version epoch after the position or history was replaced
+        (reset, load); clients holding an older version get the full state.
+        """
+        self.epoch = os.urandom(4).hex()
+        self.recent_positions = {}
+        self._remember_position()
+
+    def _remember_position(self):
+        ply = len(self.move_history)
+        self.recent_positions[ply] = self.board.cells.tobytes()
+        self.recent_positions.pop(ply - RECENT_POSITIONS, None)
+
+    def delta(self, since=None):
+        """
+        Client update from version since: the changed squares and the new history
+        entries, or the whole board and history (full=True) when since is unknown
+        or too old. Always carries the new version, side to move, status (see status())
+        and legal-move map.
+        """
+        update = {'version': self.version, 'turn': self.turn, 'status': self.status(),
+                  'legal_moves': self.legal_moves()}
+        epoch, _, ply = (since or '').partition('.')
+        base = self.recent_positions.get(int(ply)) if epoch == self.epoch and ply.isdigit() else None
+        if base is None:
+            update.update(full=True, board=self.board.to_dict(), move_history=self.move_history)
+            return update
+        cells = self.board.cells
+        current = cells.tobytes()
+        update.update(full=False,
+                      changes={square_to_pos(sq): cell_dict(cells[sq])
+                               for sq in range(64) if base[sq] != current[sq]},
+                      new_moves=self.move_history[int(ply):])
+        return update
 
     def to_dict(self):
         """Serialize game state for saving/loading."""
         return {
             'board': self.board.to_dict(),
             'turn': self.turn,
-            'move_history': self.move_history
+            'move_history': self.move_history,
+            'fen': self.to_fen()
         }
 
     def from_dict(self, data):
         """Load game state from dict."""
-        self.board.from_dict(data['board'])
-        self.turn = data['turn']
-        self.move_history = data['move_history']
\ No newline at end of file
+        if 'fen' in data:
+            self.from_fen(data['fen'])
+        else:
+            self.board.from_dict(data['board'])
+            self.turn = data['turn']
+        self.move_history = data['move_history']
+        self.restart_versions()
\ No newline at end of file
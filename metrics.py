@@ -0,0 +1,157 @@
+"""
+Metrics module: In-process counters and latency histograms rendered in the
+Prometheus text exposition format, plus a sampling cProfile wrapper for
+individual searches. Everything is guarded by one lock, so request threads,
+search threads and the /metrics scrape may touch it at the same time.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+
+# Histogram bucket upper bounds in seconds (route latency, search time, phases)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _labels(labels):
+    if not labels:
+        return ''
+    text = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in labels)
+    return '{' + text + '}'
+
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # name -> (type, help text, {label tuple: value}); histogram values are [bucket counts, sum, count]
+        self.families = {}
+        # Callables returning [(name, type, help, {label tuple: value})] read at scrape time
+        self.collectors = []
+
+    def _family(self, name, kind, help_text):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = (kind, help_text, {})
+        return family[2]
+
+    def inc(self, name, help_text, value=1, **labels):
+        """Add value to a counter."""
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self._family(name, 'counter', help_text)
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, help_text, value, **labels):
+        """Record value (seconds) in a histogram."""
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self._family(name, 'histogram', help_text)
+            entry = series.get(key)
+            if entry is None:
+                entry = series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def register(self, collector):
+        self.collectors.append(collector)
+
+    def search_observer(self, searcher):
+        """Return a ChessAI.observer that records each search's stats under the searcher label."""
+        def observe(stats):
+            if stats.get('book_hit'):
+                source = 'book'
+            elif stats.get('tb_hit'):
+                source = 'tablebase'
+            elif stats.get('cache_hit'):
+                source = 'cache'
+            else:
+                source = 'search'
+            self.inc('chess_searches_total', 'Searches by how they were answered.', searcher=searcher, source=source)
+            self.observe('chess_search_duration_seconds', 'Wall time per search.',
+                         stats.get('elapsed_ms', 0) / 1000, searcher=searcher)
+            for phase, ms in stats.get('phase_ms', {}).items():
+                self.observe('chess_search_phase_seconds', 'Wall time per search phase.', ms / 1000,
+                             searcher=searcher, phase=phase)
+            for counter in ('nodes', 'qnodes', 'cutoffs', 'tt_hits', 'tt_misses'):
+                if stats.get(counter):
+                    self.inc(f'chess_search_{counter}_total', f'Search {counter.replace("_", " ")}.',
+                             stats[counter], searcher=searcher)
+            self.inc('chess_search_depth_total', 'Sum of completed search depths (divide by searches).',
+                     stats.get('depth', 0), searcher=searcher)
+        return observe
+
+    def render(self):
+        """Return every metric in the Prometheus text format."""
+        lines = []
+        families = []
+        with self.lock:
+            for name, (kind, help_text, series) in sorted(self.families.items()):
+                snapshot = {key: (list(value[0]), value[1], value[2]) if kind == 'histogram' else value
+                            for key, value in series.items()}
+                families.append((name, kind, help_text, snapshot))
+        for collector in self.collectors:
+            families.extend(collector())
+        for name, kind, help_text, series in families:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, value in sorted(series.items()):
+                if kind != 'histogram':
+                    lines.append(f'{name}{_labels(key)} {value}')
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, hits in zip(self.buckets, counts):
+                    cumulative += hits
+                    lines.append(f'{name}_bucket{_labels(key + (("le", repr(bound)),))} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(key + (("le", "+Inf"),))} {count}')
+                lines.append(f'{name}_sum{_labels(key)} {total}')
+                lines.append(f'{name}_count{_labels(key)} {count}')
+        return '\n'.join(lines) + '\n'
+
+class SearchProfiler:
+    """
+    Runs one in every `every` searches under cProfile (profiling slows a search
+    several times over, hence sampling). Each profile is written to directory as
+    a .prof file for pstats/snakeviz, and the top functions of the latest one
+    are kept in last_report.
+    """
+    def __init__(self, every, directory=None, top=25):
+        self.every = every
+        self.directory = directory
+        self.top = top
+        self.count = 0
+        # Only one profiler may be active at a time; searches sampled meanwhile run unprofiled
+        self.active = False
+        self.lock = threading.Lock()
+        self.last_report = ''
+
+    def run(self, fn, *args):
+        with self.lock:
+            self.count += 1
+            sampled = self.every > 0 and self.count % self.every == 0 and not self.active
+            if sampled:
+                self.active = True
+        if not sampled:
+            return fn(*args)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(fn, *args)
+        finally:
+            self._report(profile)
+
+    def _report(self, profile):
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(os.path.join(self.directory, f'search-{time.time():.3f}.prof'))
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(self.top)
+        with self.lock:
+            self.last_report = out.getvalue()
+            self.active = False
@@ -0,0 +1,109 @@
+"""
+Parallel module: Root-parallel search over a long-lived process pool.
+Root moves are dealt out round-robin to warmed-up workers, each of which keeps
+its own ChessAI (and transposition table) between requests. Positions travel
+to the workers as 64-byte board snapshots. Other jobs that need a worker's
+ChessAI (e.g. batch game reviews) run on the same pool through submit().
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from ai import ChessAI, SearchTimeout, SEARCH_COUNTERS
+from engine import create_board
+
+# The ChessAI owned by this worker process
+_worker_ai = None
+
+def _init_worker(engine, tt_size_mb, batch_eval):
+    global _worker_ai
+    _worker_ai = ChessAI(engine, tt_size_mb, batch_eval=batch_eval)
+    # Workers keep their tables between requests for different root moves; a result must
+    # not depend on which moves a worker happened to search before
+    _worker_ai.exact_tt_depth = True
+
+def _ping():
+    return os.getpid()
+
+def _call(fn, args):
+    """Worker entry point for submit(): call fn with this worker's ChessAI first."""
+    return fn(_worker_ai, *args)
+
+def _score_chunk(packed, color, moves, depth, time_ms, max_nodes):
+    """Worker entry point: score a share of the root moves. Returns (scored or None, stats)."""
+    ai = _worker_ai
+    board = create_board(ai.engine)
+    board.from_bytes(packed)
+    hits, misses = ai.tt.hits, ai.tt.misses
+    ai.begin_search(time_ms, max_nodes)
+    try:
+        scored = ai.score_root(board, color, moves, depth)
+    except SearchTimeout:
+        scored = None
+    ai.stats['tt_hits'] = ai.tt.hits - hits
+    ai.stats['tt_misses'] = ai.tt.misses - misses
+    return scored, ai.stats
+
+class SearchPool:
+    def __init__(self, workers, engine=None, tt_size_mb=16, batch_eval=False):
+        self.workers = workers
+        self.engine = engine
+        self.tt_size_mb = tt_size_mb
+        self.batch_eval = batch_eval
+        self.executor = None
+
+    def start(self):
+        """Start the worker processes and wait until every one of them is up."""
+        if self.executor is not None:
+            return
+        self.executor = ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.engine, self.tt_size_mb, self.batch_eval),
+        )
+        # One ping per worker makes the executor spawn all of them now
+        for future in [self.executor.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+
+    def submit(self, fn, *args):
+        """Run fn(worker ChessAI, *args) on a worker; fn must be a module-level function. Returns a Future."""
+        self.start()
+        return self.executor.submit(_call, fn, args)
+
+    def score_root(self, board, color, moves, depth, ai):
+        """
+        Score root moves across the workers, merging their counters into ai.stats.
+        Raises SearchTimeout when any worker ran out of budget.
+        """
+        self.start()
+        packed = board.to_bytes()
+        time_ms = None
+        if ai._deadline is not None:
+            time_ms = max(0.0, (ai._deadline - time.perf_counter()) * 1000)
+        chunks = [chunk for chunk in (moves[i::self.workers] for i in range(self.workers)) if chunk]
+        max_nodes = None
+        if ai._max_nodes is not None:
+            max_nodes = max(1, (ai._max_nodes - ai.stats['nodes']) // len(chunks))
+        futures = [self.executor.submit(_score_chunk, packed, color, chunk, depth, time_ms, max_nodes)
+                   for chunk in chunks]
+        scores = {}
+        timed_out = False
+        for future in futures:
+            scored, stats = future.result()
+            for name in SEARCH_COUNTERS:
+                ai.stats[name] += stats.get(name, 0)
+            if scored is None:
+                timed_out = True
+            else:
+                scores.update(scored)
+        if timed_out:
+            raise SearchTimeout()
+        return [(move, scores[move]) for move in moves]
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
@@ -1,8 +1,16 @@
 """
 Piece module: Defines Piece base class and subclasses for Pawn, Knight, Bishop, Rook, Queen, King.
-Each piece implements legal move validation.
+Move generation is table-driven over a flat 64-square mailbox of integer piece codes
+(positive for white, negative for black); Piece objects are lightweight views used by
+the game and coach layers.
 """
 
+EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(7)
+
+# Index with (value + 6) to get the letter for an integer piece code
+PIECE_CHARS = 'kqrbnp.PNBRQK'
+CODE_TO_INT = {ch: i - 6 for i, ch in enumerate(PIECE_CHARS) if ch != '.'}
+
 def pos_to_coords(pos):
     """Convert algebraic notation (e.g., 'e4') to (row, col)."""
     if isinstance(pos, tuple):
@@ -16,7 +24,184 @@ def coords_to_pos(coords):
     row, col = coords
     return chr(col + ord('a')) + str(8 - row)
 
+def to_square(coords):
+    """Convert (row, col) to a mailbox index 0..63."""
+    row, col = coords
+    return row * 8 + col
+
+def from_square(sq):
+    """Convert a mailbox index 0..63 to (row, col)."""
+    return divmod(sq, 8)
+
+def square_to_pos(sq):
+    """Convert a mailbox index 0..63 to algebraic notation."""
+    return coords_to_pos(divmod(sq, 8))
+
+# Precomputed target tables, indexed by square
+ROOK_DIRS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BISHOP_DIRS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+KNIGHT_STEPS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+KING_STEPS = [(dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc]
+
+def _steps(sq, deltas):
+    r, c = divmod(sq, 8)
+    return tuple((r + dr) * 8 + c + dc for dr, dc in deltas if 0 <= r + dr < 8 and 0 <= c + dc < 8)
+
+def _rays(sq, dirs):
+    r, c = divmod(sq, 8)
+    rays = []
+    for dr, dc in dirs:
+        ray = []
+        nr, nc = r + dr, c + dc
+        while 0 <= nr < 8 and 0 <= nc < 8:
+            ray.append(nr * 8 + nc)
+            nr += dr
+            nc += dc
+        if ray:
+            rays.append(tuple(ray))
+    return tuple(rays)
+
+KNIGHT_TARGETS = tuple(_steps(sq, KNIGHT_STEPS) for sq in range(64))
+KING_TARGETS = tuple(_steps(sq, KING_STEPS) for sq in range(64))
+ROOK_RAYS = tuple(_rays(sq, ROOK_DIRS) for sq in range(64))
+BISHOP_RAYS = tuple(_rays(sq, BISHOP_DIRS) for sq in range(64))
+QUEEN_RAYS = tuple(ROOK_RAYS[sq] + BISHOP_RAYS[sq] for sq in range(64))
+SLIDER_RAYS = {BISHOP: BISHOP_RAYS, ROOK: ROOK_RAYS, QUEEN: QUEEN_RAYS}
+STEPPER_TARGETS = {KNIGHT: KNIGHT_TARGETS, KING: KING_TARGETS}
+# Pawn tables, indexed by [white, black][sq]; white moves towards row 0
+PAWN_CAPTURES = tuple(tuple(_steps(sq, [(d, -1), (d, 1)]) for sq in range(64)) for d in (-1, 1))
+PAWN_START_ROW = (6, 1)
+
+def _line_mask(sq):
+    bits = 0
+    for ray in QUEEN_RAYS[sq]:
+        for target in ray:
+            bits |= 1 << target
+    return bits
+
+# Squares sharing a rank, file or diagonal with sq: only pieces there can be pinned to a king on sq
+QUEEN_LINES = tuple(_line_mask(sq) for sq in range(64))
+
+def piece_targets(cells, sq):
+    """Return the target squares reachable by the piece on sq."""
+    value = cells[sq]
+    kind = value if value > 0 else -value
+    moves = []
+    if kind == PAWN:
+        side = 0 if value > 0 else 1
+        step = -8 if value > 0 else 8
+        ahead = sq + step
+        if 0 <= ahead < 64 and not cells[ahead]:
+            moves.append(ahead)
+            if sq >> 3 == PAWN_START_ROW[side] and not cells[ahead + step]:
+                moves.append(ahead + step)
+        for target in PAWN_CAPTURES[side][sq]:
+            other = cells[target]
+            if other and (other > 0) != (value > 0):
+                moves.append(target)
+    elif kind in SLIDER_RAYS:
+        for ray in SLIDER_RAYS[kind][sq]:
+            for target in ray:
+                other = cells[target]
+                if not other:
+                    moves.append(target)
+                else:
+                    if (other > 0) != (value > 0):
+                        moves.append(target)
+                    break
+    elif kind:
+        for target in STEPPER_TARGETS[kind][sq]:
+            other = cells[target]
+            if not other or (other > 0) != (value > 0):
+                moves.append(target)
+    return moves
+
+def generate_moves(cells, color):
+    """Return all pseudo-legal moves [(from_sq, to_sq), ...] for color, in board scan order."""
+    white = color == 'w'
+    moves = []
+    for sq in range(64):
+        value = cells[sq]
+        if value and (value > 0) == white:
+            moves.extend((sq, target) for target in piece_targets(cells, sq))
+    return moves
+
+def generate_captures(cells, color):
+    """Return the capturing subset of generate_moves(cells, color)."""
+    white = color == 'w'
+    moves = []
+    for sq in range(64):
+        value = cells[sq]
+        if not value or (value > 0) != white:
+            continue
+        kind = value if value > 0 else -value
+        if kind == PAWN:
+            targets = PAWN_CAPTURES[0 if white else 1][sq]
+        elif kind in SLIDER_RAYS:
+            targets = []
+            for ray in SLIDER_RAYS[kind][sq]:
+                for target in ray:
+                    if cells[target]:
+                        targets.append(target)
+                        break
+        else:
+            targets = STEPPER_TARGETS[kind][sq]
+        for target in targets:
+            other = cells[target]
+            if other and (other > 0) != white:
+                moves.append((sq, target))
+    return moves
+
+def attacked_squares(cells, side):
+    """Return the set of squares attacked by side (0 white, 1 black) as a 64-bit mask."""
+    white = side == 0
+    bits = 0
+    for sq in range(64):
+        value = cells[sq]
+        if not value or (value > 0) != white:
+            continue
+        kind = value if value > 0 else -value
+        if kind == PAWN:
+            targets = PAWN_CAPTURES[side][sq]
+        elif kind in SLIDER_RAYS:
+            targets = []
+            for ray in SLIDER_RAYS[kind][sq]:
+                for target in ray:
+                    targets.append(target)
+                    if cells[target]:
+                        break
+        else:
+            targets = STEPPER_TARGETS[kind][sq]
+        for target in targets:
+            bits |= 1 << target
+    return bits
+
+def square_attacked(cells, sq, side):
+    """True if any piece of side (0 white, 1 black) attacks sq, probing outwards from sq."""
+    sign = 1 if side == 0 else -1
+    for target in KNIGHT_TARGETS[sq]:
+        if cells[target] == sign * KNIGHT:
+            return True
+    for target in KING_TARGETS[sq]:
+        if cells[target] == sign * KING:
+            return True
+    # A pawn of side attacks sq from the squares a pawn of the other side would capture on
+    for target in PAWN_CAPTURES[1 - side][sq]:
+        if cells[target] == sign * PAWN:
+            return True
+    for rays, kind in ((ROOK_RAYS, ROOK), (BISHOP_RAYS, BISHOP)):
+        for ray in rays[sq]:
+            for target in ray:
+                value = cells[target]
+                if value:
+                    if value == sign * kind or value == sign * QUEEN:
+                        return True
+                    break
+    return False
+
 class Piece:
+    __slots__ = ('color', 'position', 'code')
+
     def __init__(self, color, position, code):
         self.color = color  # 'w' or 'b'
         self.position = position  # (row, col)
@@ -24,7 +209,7 @@ class Piece:
 
     def get_legal_moves(self, board):
         """Return list of legal moves [(row, col), ...] for this piece."""
-        return []
+        return [divmod(sq, 8) for sq in board.piece_targets(to_square(self.position))]
 
     def to_dict(self):
         """Serialize piece for frontend."""
@@ -35,115 +220,31 @@ class Piece:
         return create_piece(self.code, self.position)
 
 class Pawn(Piece):
-    def get_legal_moves(self, board):
-        moves = []
-        r, c = self.position
-        direction = -1 if self.color == 'w' else 1
-        start_row = 6 if self.color == 'w' else 1
-        # Forward move
-        if 0 <= r + direction < 8 and not board.get_piece((r + direction, c)):
-            moves.append((r + direction, c))
-            # Double move from start
-            if r == start_row and not board.get_piece((r + 2 * direction, c)):
-                moves.append((r + 2 * direction, c))
-        # Captures
-        for dc in [-1, 1]:
-            nc = c + dc
-            nr = r + direction
-            if 0 <= nc < 8 and 0 <= nr < 8:
-                target = board.get_piece((nr, nc))
-                if target and target.color != self.color:
-                    moves.append((nr, nc))
-        return moves
+    __slots__ = ()
 
 class Knight(Piece):
-    def get_legal_moves(self, board):
-        moves = []
-        r, c = self.position
-        for dr, dc in [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]:
-            nr, nc = r + dr, c + dc
-            if 0 <= nr < 8 and 0 <= nc < 8:
-                target = board.get_piece((nr, nc))
-                if not target or target.color != self.color:
-                    moves.append((nr, nc))
-        return moves
+    __slots__ = ()
 
 class Bishop(Piece):
-    def get_legal_moves(self, board):
-        moves = []
-        r, c = self.position
-        for dr, dc in [(-1, -1), (-1, 1), (1, -1), (1, 1)]:
-            nr, nc = r + dr, c + dc
-            while 0 <= nr < 8 and 0 <= nc < 8:
-                target = board.get_piece((nr, nc))
-                if not target:
-                    moves.append((nr, nc))
-                elif target.color != self.color:
-                    moves.append((nr, nc))
-                    break
-                else:
-                    break
-                nr += dr
-                nc += dc
-        return moves
+    __slots__ = ()
 
 class Rook(Piece):
-    def get_legal_moves(self, board):
-        moves = []
-        r, c = self.position
-        for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            nr, nc = r + dr, c + dc
-            while 0 <= nr < 8 and 0 <= nc < 8:
-                target = board.get_piece((nr, nc))
-                if not target:
-                    moves.append((nr, nc))
-                elif target.color != self.color:
-                    moves.append((nr, nc))
-                    break
-                else:
-                    break
-                nr += dr
-                nc += dc
-        return moves
+    __slots__ = ()
 
 class Queen(Piece):
-    def get_legal_moves(self, board):
-        # Queen combines rook and bishop moves
-        return Rook(self.color, self.position, self.code).get_legal_moves(board) + \
-               Bishop(self.color, self.position, self.code).get_legal_moves(board)
+    __slots__ = ()
 
 class King(Piece):
-    def get_legal_moves(self, board):
-        moves = []
-        r, c = self.position
-        for dr in [-1, 0, 1]:
-            for dc in [-1, 0, 1]:
-                if dr == 0 and dc == 0:
-                    continue
-                nr, nc = r + dr, c + dc
-                if 0 <= nr < 8 and 0 <= nc < 8:
-                    target = board.get_piece((nr, nc))
-                    if not target or target.color != self.color:
-                        moves.append((nr, nc))
-        return moves
+    __slots__ = ()
+
+PIECE_CLASSES = {'P': Pawn, 'N': Knight, 'B': Bishop, 'R': Rook, 'Q': Queen, 'K': King}
 
 def create_piece(code, position):
     """Factory for creating pieces from code."""
     if not code:
         return None
+    cls = PIECE_CLASSES.get(code.upper())
+    if cls is None:
+        return None
     color = 'w' if code.isupper() else 'b'
-    code_upper = code.upper()
-    if code_upper == 'P':
-        return Pawn(color, position, code)
-    elif code_upper == 'N':
-        return Knight(color, position, code)
-    elif code_upper == 'B':
-        return Bishop(color, position, code)
-    elif code_upper == 'R':
-        return Rook(color, position, code)
-    elif code_upper == 'Q':
-        return Queen(color, position, code)
-    elif code_upper == 'K':
-        return King(color, position, code)
-    else:
-        return None
\ No newline at end of file
+    return cls(color, position, code)
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+Ponder module: Background analysis while the human is thinking.
+After each /move the ponderer searches the player's position (which answers
+/suggest), predicts the player's reply from that search, and pre-searches the
+AI's answer to it. Results land in the shared AnalysisCache, so the next
+/suggest and, when the prediction hits, the next /move are served from cache.
+Every game has its own Ponderer, but searches borrow a ChessAI from a shared
+queue, so the number of games pondering at once (and the memory their
+transposition tables use) is bounded by the size of that queue.
+"""
+
+import queue
+import threading
+from ai import ChessAI
+
+def make_searchers(count, engine=None, analysis=None, tt_size_mb=16, batch_eval=False):
+    """Return a queue holding count ChessAI instances for Ponderers to share."""
+    searchers = queue.Queue()
+    for _ in range(count):
+        searchers.put(ChessAI(engine, tt_size_mb=tt_size_mb, analysis=analysis, batch_eval=batch_eval))
+    return searchers
+
+class Ponderer:
+    def __init__(self, searchers, time_ms=500):
+        # Queue of idle ChessAI instances; a session only runs if it can take one
+        self.searchers = searchers
+        # Budget for each of the (at most two) searches per ponder session
+        self.time_ms = time_ms
+        self.thread = None
+        self.stop_event = None
+        self.prediction = None
+        self.stats = {'started': 0, 'completed': 0, 'cancelled': 0, 'skipped': 0}
+
+    def start(self, game_state, reply=True):
+        """
+        Cancel any running session and ponder the game's current position.
+        With reply=True also pre-search the opponent's answer to the predicted move.
+        """
+        self.cancel()
+        self.prediction = None
+        try:
+            ai = self.searchers.get_nowait()
+        except queue.Empty:
+            # Every searcher is busy with other games; this game goes without
+            self.stats['skipped'] += 1
+            return
+        board = game_state.board.copy()
+        self.stop_event = threading.Event()
+        ai.stop_event = self.stop_event
+        self.thread = threading.Thread(target=self._run, args=(ai, board, game_state.turn, reply, self.stop_event),
+                                       name='ponder', daemon=True)
+        self.stats['started'] += 1
+        self.thread.start()
+
+    def cancel(self):
+        """Stop the running session (if any) and wait for its thread to exit."""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _run(self, ai, board, color, reply, stop_event):
+        try:
+            predicted = ai.search(board, color, None, time_ms=self.time_ms)
+            if stop_event.is_set() or predicted is None:
+                return
+            self.prediction = predicted
+            if reply:
+                board.make_move(*predicted)
+                ai.search(board, 'b' if color == 'w' else 'w', None, time_ms=self.time_ms)
+        finally:
+            ai.stop_event = None
+            self.searchers.put(ai)
+            self._finish(stop_event)
+
+    def _finish(self, stop_event):
+        if stop_event.is_set():
+            self.stats['cancelled'] += 1
+        else:
+            self.stats['completed'] += 1
@@ -0,0 +1,88 @@
+"""
+Piece-square tables: Material values and positional bonuses used by the
+board's incrementally updated evaluation. Tables are written from white's
+point of view with row 0 (the side white advances towards) first; black
+uses the vertically mirrored square.
+"""
+
+from piece import PIECE_CHARS
+
+# Material in pawns (kept for move ordering and coach messages)
+PIECE_VALUES = {'P': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 1000}
+CENTIPAWNS = 100
+
+PST = {
+    'P': [
+         0,   0,   0,   0,   0,   0,   0,   0,
+        50,  50,  50,  50,  50,  50,  50,  50,
+        10,  10,  20,  30,  30,  20,  10,  10,
+         5,   5,  10,  25,  25,  10,   5,   5,
+         0,   0,   0,  20,  20,   0,   0,   0,
+         5,  -5, -10,   0,   0, -10,  -5,   5,
+         5,  10,  10, -20, -20,  10,  10,   5,
+         0,   0,   0,   0,   0,   0,   0,   0,
+    ],
+    'N': [
+       -50, -40, -30, -30, -30, -30, -40, -50,
+       -40, -20,   0,   0,   0,   0, -20, -40,
+       -30,   0,  10,  15,  15,  10,   0, -30,
+       -30,   5,  15,  20,  20,  15,   5, -30,
+       -30,   0,  15,  20,  20,  15,   0, -30,
+       -30,   5,  10,  15,  15,  10,   5, -30,
+       -40, -20,   0,   5,   5,   0, -20, -40,
+       -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    'B': [
+       -20, -10, -10, -10, -10, -10, -10, -20,
+       -10,   0,   0,   0,   0,   0,   0, -10,
+       -10,   0,   5,  10,  10,   5,   0, -10,
+       -10,   5,   5,  10,  10,   5,   5, -10,
+       -10,   0,  10,  10,  10,  10,   0, -10,
+       -10,  10,  10,  10,  10,  10,  10, -10,
+       -10,   5,   0,   0,   0,   0,   5, -10,
+       -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    'R': [
+         0,   0,   0,   0,   0,   0,   0,   0,
+         5,  10,  10,  10,  10,  10,  10,   5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+         0,   0,   0,   5,   5,   0,   0,   0,
+    ],
+    'Q': [
+       -20, -10, -10,  -5,  -5, -10, -10, -20,
+       -10,   0,   0,   0,   0,   0,   0, -10,
+       -10,   0,   5,   5,   5,   5,   0, -10,
+        -5,   0,   5,   5,   5,   5,   0,  -5,
+         0,   0,   5,   5,   5,   5,   0,  -5,
+       -10,   5,   5,   5,   5,   5,   0, -10,
+       -10,   0,   5,   0,   0,   0,   0, -10,
+       -20, -10, -10,  -5,  -5, -10, -10, -20,
+    ],
+    'K': [
+       -30, -40, -40, -50, -50, -40, -40, -30,
+       -30, -40, -40, -50, -50, -40, -40, -30,
+       -30, -40, -40, -50, -50, -40, -40, -30,
+       -30, -40, -40, -50, -50, -40, -40, -30,
+       -20, -30, -30, -40, -40, -30, -30, -20,
+       -10, -20, -20, -20, -20, -20, -20, -10,
+        20,  20,   0,   0,   0,   0,  20,  20,
+        20,  30,  10,   0,   0,  10,  30,  20,
+    ],
+}
+
+def _square_scores(ch):
+    if ch == '.':
+        return [0] * 64
+    kind = ch.upper()
+    material = PIECE_VALUES[kind] * CENTIPAWNS
+    if ch.isupper():
+        return [material + PST[kind][sq] for sq in range(64)]
+    return [-(material + PST[kind][sq ^ 56]) for sq in range(64)]
+
+# Signed material + positional score of a piece on a square, indexed by
+# (integer piece code + 6) and square; white positive, black negative
+SQUARE_SCORES = [_square_scores(ch) for ch in PIECE_CHARS]
@@ -0,0 +1,146 @@
+"""
+Registry module: One GameSession per game id, so concurrent players no longer
+share a board. At most max_active sessions are kept in memory; the least
+recently used ones, and any left idle for idle_seconds, are spilled to JSON
+files under spill_dir and restored transparently on their next request.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+GAME_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def valid_game_id(game_id):
+    """Game ids become file names, so only short [A-Za-z0-9_-] ids are accepted."""
+    return isinstance(game_id, str) and GAME_ID_PATTERN.match(game_id) is not None
+
+class GameSession:
+    def __init__(self, game_id, game_state, coach, ponderer):
+        self.game_id = game_id
+        self.game_state = game_state
+        self.coach = coach
+        self.ponderer = ponderer
+        # Held for the whole of a request, so moves on one game never interleave
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        # Set once the session has been spilled; holders of a stale reference must look it up again
+        self.evicted = False
+
+    def to_dict(self):
+        return {'game': self.game_state.to_dict(), 'last_feedback': self.coach.last_feedback}
+
+    def from_dict(self, data):
+        self.game_state.from_dict(data['game'])
+        self.coach.last_feedback = data.get('last_feedback', [])
+
+class GameRegistry:
+    def __init__(self, factory, spill_dir, max_active=1000, idle_seconds=600):
+        # factory(game_id) returns a fresh GameSession
+        self.factory = factory
+        self.spill_dir = spill_dir
+        self.max_active = max_active
+        self.idle_seconds = idle_seconds
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        # Victims picked but not yet removed, so concurrent evictions do not overshoot
+        self.spilling = 0
+        self.stats = {'created': 0, 'restored': 0, 'spilled': 0}
+
+    @contextmanager
+    def session(self, game_id):
+        """Yield the session for game_id with its lock held."""
+        while True:
+            session = self._get(game_id)
+            session.lock.acquire()
+            if not session.evicted:
+                break
+            # Spilled while we waited for the lock; the next lookup restores it from disk
+            session.lock.release()
+        try:
+            session.last_used = time.monotonic()
+            yield session
+        finally:
+            session.lock.release()
+            self.evict()
+
+    def _get(self, game_id):
+        with self.lock:
+            session = self.sessions.get(game_id)
+            if session is not None:
+                self.sessions.move_to_end(game_id)
+                return session
+            session = self.factory(game_id)
+            path = self._spill_path(game_id)
+            if os.path.exists(path):
+                try:
+                    with open(path, 'r') as f:
+                        session.from_dict(json.load(f))
+                    self.stats['restored'] += 1
+                except Exception:
+                    session.game_state.reset()
+            else:
+                self.stats['created'] += 1
+            self.sessions[game_id] = session
+            return session
+
+    def evict(self):
+        """Spill sessions beyond max_active and sessions idle for longer than idle_seconds."""
+        while True:
+            victim = self._pick_victim()
+            if victim is None:
+                return
+            self._spill(victim)
+
+    def _pick_victim(self):
+        now = time.monotonic()
+        with self.lock:
+            excess = len(self.sessions) - self.spilling - self.max_active
+            # Sessions are in least recently used order; skip any that are in use
+            for session in self.sessions.values():
+                if excess <= 0 and now - session.last_used < self.idle_seconds:
+                    return None
+                if session.lock.acquire(blocking=False):
+                    self.spilling += 1
+                    return session
+            return None
+
+    def _spill(self, session):
+        """Write a locked session to disk, then drop it from memory and release it."""
+        try:
+            session.ponderer.cancel()
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = self._spill_path(session.game_id)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(session.to_dict(), f)
+            os.replace(tmp_path, path)
+            with self.lock:
+                if self.sessions.get(session.game_id) is session:
+                    del self.sessions[session.game_id]
+                session.evicted = True
+                self.stats['spilled'] += 1
+        finally:
+            with self.lock:
+                self.spilling -= 1
+            session.lock.release()
+
+    def close(self):
+        """Spill every idle session, e.g. on shutdown."""
+        with self.lock:
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            if session.lock.acquire(blocking=False):
+                with self.lock:
+                    self.spilling += 1
+                self._spill(session)
+
+    def _spill_path(self, game_id):
+        return os.path.join(self.spill_dir, game_id + '.json')
+
+    def __len__(self):
+        return len(self.sessions)
@@ -17,12 +17,33 @@ let lastMove = null;
 let currentTurn = 'w'; // 'w' or 'b'
 let mode = modeSelect ? modeSelect.value : 'ai'; // 'ai' or 'human'
 let legalMoves = [];
+let legalMoveMap = {}; // from square -> [to squares] for the side to move, computed by the server
+let version = null; // last state version received from the server
+const gameId = getGameId();
+
+const STATUS_MESSAGES = {check: 'Check!', checkmate: 'Checkmate!', stalemate: 'Stalemate: the game is drawn.'};
 
 const PIECE_UNICODE = {
     'wP': '♙', 'wN': '♘', 'wB': '♗', 'wR': '♖', 'wQ': '♕', 'wK': '♔',
     'bP': '♟', 'bN': '♞', 'bB': '♝', 'bR': '♜', 'bQ': '♛', 'bK': '♚'
 };
 
+function getGameId() {
+    // One game per browser: ?game=<id> picks a game explicitly, otherwise an id is kept in localStorage
+    const fromUrl = new URLSearchParams(window.location.search).get('game');
+    if (fromUrl) return fromUrl;
+    let id = localStorage.getItem('chessGameId');
+    if (!id) {
+        id = 'g' + Date.now().toString(36) + Math.random().toString(36).slice(2, 10);
+        localStorage.setItem('chessGameId', id);
+    }
+    return id;
+}
+
+function gameUrl(path) {
+    return path + '?game_id=' + encodeURIComponent(gameId);
+}
+
 function posToCoords(pos) {
     const col = pos.charCodeAt(0) - 'a'.charCodeAt(0);
     const row = 8 - parseInt(pos[1]);
@@ -78,126 +99,21 @@ function renderMoveHistory() {
     }
 }
 
-// Helper: get legal moves for a piece at (r, c)
-function getLegalMoves(r, c) {
-    const piece = boardState[r][c];
-    if (!piece) return [];
-    let moves = [];
-    // Pawn
-    if (piece.code.toUpperCase() === 'P') {
-        let dir = piece.color === 'w' ? -1 : 1;
-        let startRow = piece.color === 'w' ? 6 : 1;
-        // Forward
-        if (inBounds(r + dir, c) && !boardState[r + dir][c]) {
-            moves.push([r + dir, c]);
-            if (r === startRow && !boardState[r + 2 * dir][c]) {
-                moves.push([r + 2 * dir, c]);
-            }
-        }
-        // Captures
-        for (let dc of [-1, 1]) {
-            let nr = r + dir, nc = c + dc;
-            if (inBounds(nr, nc) && boardState[nr][nc] && boardState[nr][nc].color !== piece.color) {
-                moves.push([nr, nc]);
-            }
-        }
-    }
-    // Knight
-    else if (piece.code.toUpperCase() === 'N') {
-        for (let [dr, dc] of [[-2, -1], [-2, 1], [-1, -2], [-1, 2], [1, -2], [1, 2], [2, -1], [2, 1]]) {
-            let nr = r + dr, nc = c + dc;
-            if (inBounds(nr, nc) && (!boardState[nr][nc] || boardState[nr][nc].color !== piece.color)) {
-                moves.push([nr, nc]);
-            }
-        }
-    }
-    // Bishop
-    else if (piece.code.toUpperCase() === 'B') {
-        for (let [dr, dc] of [[-1, -1], [-1, 1], [1, -1], [1, 1]]) {
-            let nr = r + dr, nc = c + dc;
-            while (inBounds(nr, nc)) {
-                if (!boardState[nr][nc]) {
-                    moves.push([nr, nc]);
-                } else {
-                    if (boardState[nr][nc].color !== piece.color) moves.push([nr, nc]);
-                    break;
-                }
-                nr += dr; nc += dc;
-            }
-        }
-    }
-    // Rook
-    else if (piece.code.toUpperCase() === 'R') {
-        for (let [dr, dc] of [[-1, 0], [1, 0], [0, -1], [0, 1]]) {
-            let nr = r + dr, nc = c + dc;
-            while (inBounds(nr, nc)) {
-                if (!boardState[nr][nc]) {
-                    moves.push([nr, nc]);
-                } else {
-                    if (boardState[nr][nc].color !== piece.color) moves.push([nr, nc]);
-                    break;
-                }
-                nr += dr; nc += dc;
-            }
-        }
-    }
-    // Queen
-    else if (piece.code.toUpperCase() === 'Q') {
-        // Rook + Bishop
-        moves = moves.concat(getLegalMovesForType(r, c, 'R'));
-        moves = moves.concat(getLegalMovesForType(r, c, 'B'));
-    }
-    // King
-    else if (piece.code.toUpperCase() === 'K') {
-        for (let dr = -1; dr <= 1; dr++) {
-            for (let dc = -1; dc <= 1; dc++) {
-                if (dr === 0 && dc === 0) continue;
-                let nr = r + dr, nc = c + dc;
-                if (inBounds(nr, nc) && (!boardState[nr][nc] || boardState[nr][nc].color !== piece.color)) {
-                    moves.push([nr, nc]);
-                }
-            }
-        }
-    }
-    return moves;
-}
-
-// Helper for Queen moves
-function getLegalMovesForType(r, c, type) {
-    const piece = boardState[r][c];
-    let moves = [];
-    if (type === 'R') {
-        for (let [dr, dc] of [[-1, 0], [1, 0], [0, -1], [0, 1]]) {
-            let nr = r + dr, nc = c + dc;
-            while (inBounds(nr, nc)) {
-                if (!boardState[nr][nc]) {
-                    moves.push([nr, nc]);
-                } else {
-                    if (boardState[nr][nc].color !== piece.color) moves.push([nr, nc]);
-                    break;
-                }
-                nr += dr; nc += dc;
-            }
-        }
-    } else if (type === 'B') {
-        for (let [dr, dc] of [[-1, -1], [-1, 1], [1, -1], [1, 1]]) {
-            let nr = r + dr, nc = c + dc;
-            while (inBounds(nr, nc)) {
-                if (!boardState[nr][nc]) {
-                    moves.push([nr, nc]);
-                } else {
-                    if (boardState[nr][nc].color !== piece.color) moves.push([nr, nc]);
-                    break;
-                }
-                nr += dr; nc += dc;
-            }
+// Apply a server update: either the full state or the squares and moves changed since our version
+function applyUpdate(data) {
+    if (data.full) {
+        boardState = data.board;
+        moveHistory = data.move_history;
+    } else {
+        for (const [pos, piece] of Object.entries(data.changes)) {
+            const [r, c] = posToCoords(pos);
+            boardState[r][c] = piece;
         }
+        moveHistory = moveHistory.concat(data.new_moves);
     }
-    return moves;
-}
-
-function inBounds(r, c) {
-    return r >= 0 && r < 8 && c >= 0 && c < 8;
+    version = data.version;
+    currentTurn = data.turn;
+    legalMoveMap = data.legal_moves || {};
 }
 
 function onSquareClick(r, c) {
@@ -222,7 +138,7 @@ function onSquareClick(r, c) {
         legalMoves = [];
     } else if (piece && piece.color === currentTurn) {
         selected = [r, c];
-        legalMoves = getLegalMoves(r, c);
+        legalMoves = (legalMoveMap[coordsToPos(r, c)] || []).map(posToCoords);
     }
     renderBoard();
 }
@@ -232,22 +148,26 @@ async function makeMove(from, to) {
     const res = await fetch('/move', {
         method: 'POST',
         headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({from, to, mode})
+        body: JSON.stringify({game_id: gameId, from, to, mode, version})
     });
     const data = await res.json();
     if (!data.success) {
+        if (data.version) {
+            applyUpdate(data);
+            renderBoard();
+            renderMoveHistory();
+        }
         if (coachEnabled) showCoachBubbles([data.message]);
         return;
     }
-    boardState = data.board;
-    moveHistory = data.move_history;
+    applyUpdate(data);
     lastMove = {from: posToCoords(from), to: posToCoords(to)};
-    currentTurn = data.turn || (currentTurn === 'w' ? 'b' : 'w');
     selected = null;
     legalMoves = [];
     renderBoard();
     renderMoveHistory();
-    if (coachEnabled) showCoachBubbles(data.coach_feedback);
+    const status = STATUS_MESSAGES[data.status];
+    if (coachEnabled) showCoachBubbles(status ? [status].concat(data.coach_feedback) : data.coach_feedback);
 
     // If mode is AI and it's black's turn, let AI move (handled by backend, so no need to call makeAIMove)
 }
@@ -258,16 +178,14 @@ async function makeAIMove() {
     const res = await fetch('/move', {
         method: 'POST',
         headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({from: null, to: null, ai: true, mode})
+        body: JSON.stringify({game_id: gameId, from: null, to: null, ai: true, mode, version})
     });
     const data = await res.json();
     if (data.success) {
-        boardState = data.board;
-        moveHistory = data.move_history;
+        applyUpdate(data);
         lastMove = data.last_ai_move
             ? {from: posToCoords(data.last_ai_move.from), to: posToCoords(data.last_ai_move.to)}
             : null;
-        currentTurn = 'w';
         selected = null;
         legalMoves = [];
         renderBoard();
@@ -295,18 +213,16 @@ function showCoachBubbles(messages) {
 
 async function fetchCoachSuggestions() {
     if (coachToggle && !coachToggle.checked) return;
-    const res = await fetch('/suggest');
+    const res = await fetch(gameUrl('/suggest'));
     const data = await res.json();
     showCoachBubbles(data.suggestions);
 }
 
 async function fetchBoard() {
-    const res = await fetch('/load');
+    const res = await fetch(gameUrl('/load'));
     const data = await res.json();
     if (data.success) {
-        boardState = data.board;
-        moveHistory = data.move_history;
-        currentTurn = data.turn || 'w';
+        applyUpdate(data);
         selected = null;
         legalMoves = [];
         renderBoard();
@@ -318,7 +234,7 @@ async function fetchBoard() {
 }
 
 async function resetGame() {
-    await fetch('/load');
+    await fetch(gameUrl('/load'));
     location.reload();
 }
 
@@ -327,7 +243,7 @@ undoBtn.addEventListener('click', () => {
 });
 
 saveBtn.addEventListener('click', async () => {
-    await fetch('/save', {method: 'POST'});
+    await fetch(gameUrl('/save'), {method: 'POST'});
     showCoachBubbles(["Game saved!"]);
 });
 
@@ -0,0 +1,153 @@
+"""
+Storage module: Saved games in one SQLite database (stdlib sqlite3).
+Moves are appended as rows keyed by (game_id, ply), so saving only writes the
+moves made since the last save. Every SNAPSHOT_EVERY plies the current position
+is stored as well, as a packed GameState record; loading starts from the
+latest snapshot and replays the moves after it. The games row records the
+GameState epoch that wrote the line; moves are only ever appended within an
+epoch, so a save with the same epoch appends without reading the stored moves,
+and any other save rewrites the line. Each save is a single
+transaction in WAL mode, so a crash leaves either the previous or the new
+save, never a torn file.
+"""
+
+import sqlite3
+import threading
+import time
+
+# Plies between position snapshots; bounds the replay work of a load
+SNAPSHOT_EVERY = 32
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id TEXT PRIMARY KEY,
+    plies INTEGER NOT NULL,
+    updated REAL NOT NULL,
+    epoch TEXT
+);
+CREATE TABLE IF NOT EXISTS moves (
+    game_id TEXT NOT NULL,
+    ply INTEGER NOT NULL,
+    from_sq TEXT NOT NULL,
+    to_sq TEXT NOT NULL,
+    piece TEXT NOT NULL,
+    captured TEXT,
+    PRIMARY KEY (game_id, ply)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    game_id TEXT NOT NULL,
+    ply INTEGER NOT NULL,
+    position BLOB NOT NULL,
+    PRIMARY KEY (game_id, ply)
+) WITHOUT ROWID;
+"""
+
+class GameStore:
+    def __init__(self, path):
+        self.path = path
+        # One connection shared by request threads; sqlite3 objects are not thread-safe, hence the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        # Databases written before the epoch column: their lines are rewritten on the next save
+        if 'epoch' not in [row[1] for row in self.conn.execute('PRAGMA table_info(games)')]:
+            self.conn.execute('ALTER TABLE games ADD COLUMN epoch TEXT')
+        self.lock = threading.Lock()
+
+    def save(self, game_id, game_state):
+        """Append the moves made since the last save (and a snapshot when due)."""
+        history = game_state.move_history
+        with self.lock:
+            cur = self.conn.cursor()
+            cur.execute('BEGIN IMMEDIATE')
+            try:
+                cur.execute('SELECT plies, epoch FROM games WHERE game_id = ?', (game_id,))
+                row = cur.fetchone()
+                stored = row[0] if row is not None else 0
+                if stored and (row[1] != game_state.epoch or len(history) < stored):
+                    # The game was reset or replaced since the last save: start it over
+                    cur.execute('DELETE FROM moves WHERE game_id = ?', (game_id,))
+                    cur.execute('DELETE FROM snapshots WHERE game_id = ?', (game_id,))
+                    stored = 0
+                cur.executemany(
+                    'INSERT INTO moves (game_id, ply, from_sq, to_sq, piece, captured) VALUES (?, ?, ?, ?, ?, ?)',
+                    [(game_id, ply, move['from'], move['to'], move['piece'], move['captured'])
+                     for ply, move in enumerate(history[stored:], stored)])
+                plies = len(history)
+                cur.execute('SELECT MAX(ply) FROM snapshots WHERE game_id = ?', (game_id,))
+                last_snapshot = cur.fetchone()[0] or 0
+                if plies - last_snapshot >= SNAPSHOT_EVERY:
+                    cur.execute('INSERT OR REPLACE INTO snapshots (game_id, ply, position) VALUES (?, ?, ?)',
+                                (game_id, plies, game_state.to_bytes()))
+                cur.execute('INSERT OR REPLACE INTO games (game_id, plies, updated, epoch) VALUES (?, ?, ?, ?)',
+                            (game_id, plies, time.time(), game_state.epoch))
+                cur.execute('COMMIT')
+            except Exception:
+                cur.execute('ROLLBACK')
+                raise
+
+    def load(self, game_id, game_state):
+        """Restore game_id into game_state; returns False if it was never saved."""
+        with self.lock:
+            cur = self.conn.cursor()
+            plies = self._stored_plies(cur, game_id)
+            if plies is None:
+                return False
+            cur.execute('SELECT ply, position FROM snapshots WHERE game_id = ? ORDER BY ply DESC LIMIT 1', (game_id,))
+            snapshot = cur.fetchone()
+            cur.execute('SELECT from_sq, to_sq, piece, captured FROM moves WHERE game_id = ? ORDER BY ply',
+                        (game_id,))
+            rows = cur.fetchall()
+        history = [{'from': from_sq, 'to': to_sq, 'piece': piece, 'captured': captured}
+                   for from_sq, to_sq, piece, captured in rows]
+        if snapshot is not None:
+            start = snapshot[0]
+            game_state.from_bytes(snapshot[1])
+        else:
+            start = 0
+            game_state.reset()
+        # Replaying through GameState keeps the castling, en passant and clock fields right
+        for move in history[start:]:
+            ok, msg = game_state.make_move(move['from'], move['to'])
+            if not ok:
+                raise ValueError(f"Stored move {move['from']}-{move['to']} of {game_id} does not replay: {msg}")
+        game_state.move_history = history
+        game_state.restart_versions()
+        # The loaded line is the stored one, so the next save of game_state only appends
+        with self.lock:
+            self.conn.execute('UPDATE games SET epoch = ? WHERE game_id = ?', (game_state.epoch, game_id))
+        return True
+
+    def history(self, game_id):
+        """Return the stored move history of game_id without replaying it, or None."""
+        with self.lock:
+            cur = self.conn.cursor()
+            if self._stored_plies(cur, game_id) is None:
+                return None
+            cur.execute('SELECT from_sq, to_sq, piece, captured FROM moves WHERE game_id = ? ORDER BY ply',
+                        (game_id,))
+            rows = cur.fetchall()
+        return [{'from': from_sq, 'to': to_sq, 'piece': piece, 'captured': captured}
+                for from_sq, to_sq, piece, captured in rows]
+
+    def delete(self, game_id):
+        with self.lock:
+            cur = self.conn.cursor()
+            cur.execute('BEGIN IMMEDIATE')
+            for table in ('moves', 'snapshots', 'games'):
+                cur.execute(f'DELETE FROM {table} WHERE game_id = ?', (game_id,))
+            cur.execute('COMMIT')
+
+    def game_ids(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute('SELECT game_id FROM games ORDER BY game_id')]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _stored_plies(self, cur, game_id):
+        cur.execute('SELECT plies FROM games WHERE game_id = ?', (game_id,))
+        row = cur.fetchone()
+        return row[0] if row is not None else None
@@ -0,0 +1,281 @@
+"""
+Tablebase module: Endgame tables for king and one piece against a lone king
+(KQK, KRK, KPK), generated offline by retrograde analysis and probed by the AI
+and coach to play and explain these endings without searching.
+
+Each table holds one byte per (white king, black king, piece) placement for
+either side to move, with the piece always white: 0 is a draw (or an impossible
+placement) and n > 0 is a win for white, mate in n - 1 plies. A lone king can
+never win, so this single byte is both the win/draw/loss value and the distance
+to mate. Positions where black has the piece are probed through the mirrored
+board. Rules follow the engine: pawns always promote to a queen, and KPK
+promotions are resolved through the KQK table, so KQK must be generated first.
+Generate with: python tablebase.py generate games/tablebases
+"""
+
+import argparse
+import mmap
+import os
+import time
+from piece import PAWN, ROOK, QUEEN, KING_TARGETS, PAWN_CAPTURES, SLIDER_RAYS, PIECE_CHARS
+
+MAGIC = b'CHSTBL01'
+TABLE_SIZE = 64 * 64 * 64
+# Piece kind beside the strong king, in generation order (KPK promotes into KQK)
+ENDINGS = {'KQK': QUEEN, 'KRK': ROOK, 'KPK': PAWN}
+
+WHITE, BLACK = 0, 1
+KING_NEAR = tuple(frozenset(KING_TARGETS[sq]) for sq in range(64))
+
+def _lines(rays):
+    """Map each square a slider on sq reaches to the squares it passes over first."""
+    lines = []
+    for sq_rays in rays:
+        between = {}
+        for ray in sq_rays:
+            for i, target in enumerate(ray):
+                between[target] = ray[:i]
+        lines.append(between)
+    return tuple(lines)
+
+SLIDER_LINES = {kind: _lines(rays) for kind, rays in SLIDER_RAYS.items()}
+
+def index(wk, bk, piece):
+    return wk << 12 | bk << 6 | piece
+
+def _attacks(kind, piece, target, wk):
+    """True if the white piece on piece attacks target, with the white king as the only blocker."""
+    if kind == PAWN:
+        return target in PAWN_CAPTURES[WHITE][piece]
+    between = SLIDER_LINES[kind][piece].get(target)
+    return between is not None and wk not in between
+
+def _valid(kind, wk, bk, piece):
+    if wk == bk or wk == piece or bk == piece or bk in KING_NEAR[wk]:
+        return False
+    # White pawns start on row 6 and promote on row 0
+    return kind != PAWN or 1 <= piece >> 3 <= 6
+
+def _black_moves(kind, wk, bk, piece):
+    """Return (king moves that keep the piece on the board, True if the king can take the piece)."""
+    moves, takes = [], False
+    for target in KING_TARGETS[bk]:
+        if target in KING_NEAR[wk]:
+            continue
+        if target == piece:
+            takes = True
+        elif not _attacks(kind, piece, target, wk):
+            moves.append(target)
+    return moves, takes
+
+def _white_unmoves(kind, wk, bk, piece):
+    """Yield white-to-move placements from which a white move reaches (wk, bk, piece)."""
+    for source in KING_TARGETS[wk]:
+        if source != piece and source != bk and source not in KING_NEAR[bk]:
+            yield source, piece
+    if kind == PAWN:
+        behind = piece + 8
+        if behind >> 3 <= 6 and behind != wk and behind != bk:
+            yield wk, behind
+            if piece >> 3 == 4 and behind + 8 != wk and behind + 8 != bk:
+                yield wk, behind + 8
+        return
+    for ray in SLIDER_RAYS[kind][piece]:
+        for source in ray:
+            if source == wk or source == bk:
+                break
+            yield wk, source
+
+def generate(name, promotions=None):
+    """
+    Build the table for the ending name by retrograde analysis: start from the mates,
+    then walk moves backwards one ply at a time. Returns (white_to_move, black_to_move)
+    bytearrays. promotions is the (white, black) KQK table pair, required for KPK.
+    """
+    kind = ENDINGS[name]
+    wtm, btm = bytearray(TABLE_SIZE), bytearray(TABLE_SIZE)
+    # Black moves not yet known to lose, per black-to-move placement; -1 once black can draw
+    remaining = [-1] * TABLE_SIZE
+    buckets = [[]]
+    for wk in range(64):
+        for bk in range(64):
+            for piece in range(64):
+                if not _valid(kind, wk, bk, piece):
+                    continue
+                idx = index(wk, bk, piece)
+                moves, takes = _black_moves(kind, wk, bk, piece)
+                if not takes:
+                    remaining[idx] = len(moves)
+                    if not moves and _attacks(kind, piece, bk, wk):
+                        buckets[0].append((BLACK, idx))
+                if kind == PAWN and piece >> 3 == 1 and piece - 8 not in (wk, bk):
+                    # Promotion: mate in the KQK table plus this move
+                    if not _attacks(kind, piece, bk, wk):
+                        value = promotions[BLACK][index(wk, bk, piece - 8)]
+                        if value:
+                            while len(buckets) <= value:
+                                buckets.append([])
+                            buckets[value].append((WHITE, idx))
+    level = 0
+    while level < len(buckets):
+        for side, idx in buckets[level]:
+            table = wtm if side == WHITE else btm
+            if table[idx]:
+                continue
+            table[idx] = level + 1
+            wk, bk, piece = idx >> 12, idx >> 6 & 63, idx & 63
+            found = []
+            if side == BLACK:
+                # Every white move into a lost black position wins
+                for source_wk, source_piece in _white_unmoves(kind, wk, bk, piece):
+                    if not _attacks(kind, source_piece, bk, source_wk):
+                        prev = index(source_wk, bk, source_piece)
+                        if not wtm[prev]:
+                            found.append((WHITE, prev))
+            else:
+                # A black position is lost once its last move into a white win is found
+                for source in KING_TARGETS[bk]:
+                    if source == wk or source == piece or source in KING_NEAR[wk]:
+                        continue
+                    prev = index(wk, source, piece)
+                    if remaining[prev] > 0:
+                        remaining[prev] -= 1
+                        if not remaining[prev]:
+                            found.append((BLACK, prev))
+            if found:
+                if len(buckets) == level + 1:
+                    buckets.append([])
+                buckets[level + 1].extend(found)
+        buckets[level] = None
+        level += 1
+    return wtm, btm
+
+def write_table(path, tables):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(tables[WHITE])
+        f.write(tables[BLACK])
+    os.replace(tmp_path, path)
+
+class Tablebases:
+    def __init__(self, directory):
+        self.directory = directory
+        # Ending name -> read-only map of the file: magic, white-to-move table, black-to-move table
+        self.tables = {}
+        for name in ENDINGS:
+            path = os.path.join(directory, name + '.tb')
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if data[:len(MAGIC)] != MAGIC or len(data) != len(MAGIC) + 2 * TABLE_SIZE:
+                data.close()
+                raise ValueError(f"{path} is not a tablebase")
+            self.tables[name] = data
+
+    def probe(self, board, color):
+        """
+        Return (result, plies) for color to move: result is 'win', 'draw' or 'loss',
+        plies the distance to mate (None for a draw). Returns None if the material
+        is not covered by a loaded table.
+        """
+        white_king, black_king = board.kings
+        if white_king < 0 or black_king < 0:
+            return None
+        extra = None
+        for sq, value in enumerate(board.cells):
+            if value and value != 6 and value != -6:
+                if extra is not None:
+                    return None
+                extra = sq
+        if extra is None:
+            return 'draw', None
+        value = board.cells[extra]
+        data = self.tables.get('K' + PIECE_CHARS[abs(value) + 6] + 'K')
+        if data is None:
+            return None
+        # Tables hold the piece for white; mirror ranks and swap colors when black has it
+        if value > 0:
+            strong = 'w'
+            idx = index(white_king, black_king, extra)
+        else:
+            strong = 'b'
+            idx = index(black_king ^ 56, white_king ^ 56, extra ^ 56)
+        to_move = WHITE if color == strong else BLACK
+        entry = data[len(MAGIC) + to_move * TABLE_SIZE + idx]
+        if not entry:
+            return 'draw', None
+        return ('win' if to_move == WHITE else 'loss'), entry - 1
+
+    def best_move(self, board, color):
+        """
+        Return ((from_sq, to_sq), result, plies) for color's best move by the tables: the
+        fastest mate when winning, the longest defence when losing, any drawing move
+        otherwise. Returns None if the position or one of its replies is not covered.
+        """
+        if self.probe(board, color) is None:
+            return None
+        board = board.copy()
+        opponent = 'b' if color == 'w' else 'w'
+        best = None
+        for move in board.legal_moves(color):
+            undo = board.make_move(*move)
+            reply = self.probe(board, opponent)
+            board.unmake_move(undo)
+            if reply is None:
+                return None
+            result, plies = reply
+            if result == 'loss':
+                choice = (2, -plies, move, 'win', plies + 1)
+            elif result == 'draw':
+                choice = (1, 0, move, 'draw', None)
+            else:
+                choice = (0, plies, move, 'loss', plies + 1)
+            if best is None or choice[:2] > best[:2]:
+                best = choice
+        if best is None:
+            return None
+        return best[2], best[3], best[4]
+
+    def close(self):
+        for data in self.tables.values():
+            data.close()
+        self.tables = {}
+
+    def __contains__(self, name):
+        return name in self.tables
+
+def _read_tables(path):
+    """Load a written table pair, e.g. KQK for generating KPK on its own."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a tablebase")
+    body = data[len(MAGIC):]
+    return body[:TABLE_SIZE], body[TABLE_SIZE:]
+
+def main():
+    parser = argparse.ArgumentParser(description='Endgame tablebase generator')
+    parser.add_argument('command', choices=['generate'])
+    parser.add_argument('directory')
+    parser.add_argument('endings', nargs='*', default=list(ENDINGS))
+    args = parser.parse_args()
+    os.makedirs(args.directory, exist_ok=True)
+    done = {}
+    for name in ENDINGS:
+        if name not in args.endings:
+            continue
+        promotions = None
+        if ENDINGS[name] == PAWN:
+            promotions = done.get('KQK') or _read_tables(os.path.join(args.directory, 'KQK.tb'))
+        start = time.perf_counter()
+        tables = done[name] = generate(name, promotions)
+        write_table(os.path.join(args.directory, name + '.tb'), tables)
+        wins = sum(1 for value in tables[WHITE] if value)
+        longest = max(tables[WHITE]) - 1
+        print(f"{name}: {wins} white-to-move wins, longest mate {longest} plies, "
+              f"{time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()